@@ -1,52 +1,115 @@
-from requests.auth import HTTPBasicAuth
-from dotenv import load_dotenv
+import logging
 import os
-import requests
 from datetime import datetime, timedelta
+import requests
+from log_config import Truncated
+from metrics import metrics
+from snow_client import get_session, get_settings
+from watermark import Watermark
 
-def get_incidents():
-    load_dotenv()
-    user = os.getenv("user")
-    pwd = os.getenv("pwd")
-    base_url = os.getenv("url")
+logger = logging.getLogger(__name__)
 
-    # Set the request parameters
-    request_url = base_url + "incident"
-    #request_url = "https://woodplcdev.service-now.com/api/now/table/incident?sysparm_query=active%3Dtrue%5Euniversal_requestISEMPTY"
+# Only the columns model_loader, send_updates and compare_jsons actually read
+INCIDENT_FIELDS = [
+    "sys_id",
+    "number",
+    "task_effective_number",
+    "sys_created_on",
+    "opened_at",
+    "caller_id",
+    "opened_by",
+    "category",
+    "subcategory",
+    "priority",
+    "impact",
+    "urgency",
+    "cmdb_ci",
+    "location",
+    "business_unit",
+    "company",
+    "team_classification",
+    "assignment_group",
+]
 
-    print("Request URL:", request_url)
 
+def default_query():
     # Example: Get incidents created in the last 10 minutes
     time_window_minutes = 10
     time_filter = (datetime.utcnow() - timedelta(minutes=time_window_minutes)).strftime('%Y-%m-%d %H:%M:%S')
 
     # sys_created_on is the field that tracks when the record was created
-    query_string = f"sys_created_on>={time_filter}^active=true"
     #query_string = 'active%3Dtrue%5Euniversal_requestISEMPTY'
     #query_string = 'active=true^state>=1'
     #query_string = 'active=true^stateIN1' # 24 uncomments 27 comments used for all incidents.
+    return f"sys_created_on>={time_filter}^active=true"
+
+
+def iter_incident_pages(query_string=None, page_size=None, fields=INCIDENT_FIELDS):
+    """
+    Yield incidents one page at a time using sysparm_limit / sysparm_offset.
+    Pages are ordered by sys_created_on, then sys_id, so records created in the same second keep
+    one order across page requests and offsets never skip or repeat them.
+    """
+    settings = get_settings()
+    session = get_session(settings)
+    page_size = page_size or int(os.getenv("page_size", "500"))
+    query_string = query_string or default_query()
+
+    request_url = settings["base_url"] + "incident"
+    logger.info("Request URL: %s", request_url)
+
+    offset = 0
+    while True:
+        params = {
+            'sysparm_query': f"{query_string}^ORDERBYsys_created_on^ORDERBYsys_id",
+            'sysparm_limit': page_size,
+            'sysparm_offset': offset,
+        }
+        if fields:
+            params['sysparm_fields'] = ",".join(fields)
+
+        try:
+            with metrics.span("fetch"):
+                response = session.get(request_url, params=params, timeout=settings["timeout"], verify=False)
+        except Exception:
+            metrics.inc("ticket_http_errors_total", operation="fetch", status="exception")
+            raise
+        logger.debug("URL: %s Status Code: %s", response.url, response.status_code)
+
+        if response.status_code != 200:
+            metrics.inc("ticket_http_errors_total", operation="fetch", status=response.status_code)
+            logger.error("Status: %s Error Response: %s", response.status_code, Truncated(response.text))
+            response.raise_for_status()
+            # raise_for_status() only covers 4xx/5xx; any other non-200 body is not a page of results
+            raise requests.HTTPError(f"Unexpected status {response.status_code} fetching incidents", response=response)
+
+        page = response.json().get("result", [])
+        logger.info("Fetched %d incidents (offset %d)", len(page), offset)
+        if page:
+            yield page
+        if len(page) < page_size:
+            return
+        offset += page_size
 
-    params = {
-        'sysparm_query': query_string,
-        #'sysparm_limit': 1
 
-    }
+def iter_incidents(query_string=None, page_size=None, fields=INCIDENT_FIELDS):
+    """Yield incidents one by one as pages arrive."""
+    for page in iter_incident_pages(query_string, page_size, fields):
+        yield from page
 
-    headers = {
-        "Content-Type": "application/json",
-        "Accept": "application/json"
-    }
 
-    response = requests.get(request_url, auth=(user, pwd), headers=headers, params=params, verify=False)
-    #response = requests.get(request_url, auth=(user, pwd), headers=headers)
-    print("URL:", response.url)
-    print("Status Code:", response.status_code)
-    print("Response text is :",response.text)
-    print("Headers:", response.headers)
+def get_incidents(query_string=None, page_size=None, fields=INCIDENT_FIELDS):
+    """Fetch every matching incident into a ServiceNow-style {"result": [...]} payload."""
+    return {"result": list(iter_incidents(query_string, page_size, fields))}
 
-    if response.status_code != 200:
-        print('Status:', response.status_code, 'Headers:', response.headers, 'Error Response:', response.json())
-        exit()
 
-    data = response.json()
-    return data
+def get_new_incidents(watermark=None, page_size=None, fields=INCIDENT_FIELDS):
+    """
+    Fetch exactly the incidents created since the persisted watermark, minus any already processed.
+    Call watermark.advance(result).save() once the batch has been handled.
+    """
+    watermark = watermark or Watermark()
+    incidents = []
+    for page in iter_incident_pages(watermark.query(default_query), page_size, fields):
+        incidents.extend(watermark.filter_new(page))
+    return {"result": incidents}
@@ -1,126 +1,233 @@
+import logging
+import os
+import threading
 import requests
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-import os
-from requests.auth import HTTPBasicAuth
+from log_config import Truncated
+from metrics import metrics
+from snow_client import get_session, get_settings
+
+logger = logging.getLogger(__name__)
+
+# ------------------------
+# number -> sys_id resolution
+# ------------------------
+class SysIdCache:
+    """Thread-safe LRU cache of incident number -> sys_id."""
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, number):
+        with self._lock:
+            sys_id = self._data.get(number)
+            if sys_id is not None:
+                self._data.move_to_end(number)
+            return sys_id
+
+    def put(self, number, sys_id):
+        if not number or not sys_id:
+            return
+        with self._lock:
+            self._data[number] = sys_id
+            self._data.move_to_end(number)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def __len__(self):
+        return len(self._data)
+
+
+load_dotenv()
+sys_id_cache = SysIdCache(int(os.getenv("sys_id_cache_size", "10000")))
+
+
+def remember_sys_ids(incidents):
+    """Seed the cache from fetched incident records, which already carry number and sys_id."""
+    for incident in incidents:
+        sys_id = incident.get("sys_id")
+        if isinstance(sys_id, dict):
+            sys_id = sys_id.get("value")
+        sys_id_cache.put(incident.get("number"), sys_id)
+
+
+def resolve_sys_ids(incident_numbers, base_url, session, timeout, chunk_size=100):
+    """
+    Map incident numbers to sys_ids.
+    Cache hits cost nothing; the rest are fetched with one numberIN query per chunk.
+    """
+    resolved = {}
+    missing = []
+    for number in dict.fromkeys(incident_numbers):
+        sys_id = sys_id_cache.get(number)
+        if sys_id:
+            resolved[number] = sys_id
+        else:
+            missing.append(number)
 
-def get_sys_id(incident_number, base_url, user, pwd, headers):
     query_url = f"{base_url}incident"
-    params = {
-        "sysparm_query": f"number={incident_number}",
-        "sysparm_fields": "sys_id"
-    }
-
-    response = requests.get(query_url, auth=HTTPBasicAuth(user, pwd), headers=headers, params=params)
-    if response.status_code == 200:
-        result = response.json().get("result", [])
-        if result:
-            return result[0].get("sys_id")
-    print(f" Failed to fetch sys_id for {incident_number}")
-    return None
-def send_updates(ml_response):
-    print("ml response is ", ml_response)
-
-    load_dotenv()
-    user = os.getenv("user")
-    pwd = os.getenv("pwd")
-    base_url = os.getenv("url")
-    threshold = float(os.getenv("threshold"))
-
-    headers = {
-        "Content-Type": "application/json",
-        "Accept": "application/json"
-    }
-
-    for item in ml_response:
-        incident_number = item.get("Incident_ID")
-        if not incident_number:
-            print(" Incident_ID missing, skipping item.")
+    for start in range(0, len(missing), chunk_size):
+        chunk = missing[start:start + chunk_size]
+        params = {
+            "sysparm_query": "numberIN" + ",".join(chunk),
+            "sysparm_fields": "number,sys_id",
+            "sysparm_limit": len(chunk)
+        }
+        try:
+            with metrics.span("sys_id_lookup"):
+                response = session.get(query_url, params=params, timeout=timeout)
+        except requests.RequestException as e:
+            logger.warning("Exception occurred while fetching sys_ids for %d incidents: %s", len(chunk), e)
+            metrics.inc("ticket_http_errors_total", operation="sys_id_lookup", status="exception")
             continue
-
-        sys_id = get_sys_id(incident_number, base_url, user, pwd, headers)
-        if not sys_id:
+        if response.status_code != 200:
+            logger.warning("Failed to fetch sys_ids for %d incidents (status %s)", len(chunk), response.status_code)
+            metrics.inc("ticket_http_errors_total", operation="sys_id_lookup", status=response.status_code)
             continue
+        for record in response.json().get("result", []):
+            sys_id_cache.put(record.get("number"), record.get("sys_id"))
+            resolved[record.get("number")] = record.get("sys_id")
+
+    for number in missing:
+        if number not in resolved:
+            logger.warning("Failed to fetch sys_id for %s", number)
+    return resolved
+
+def build_payload(item, threshold):
+    payload = {
+        "sys_updated_by": "AI_OPS DEV"
+    }
 
-        url = f"{base_url}incident/{sys_id}"
-        print(f" URL: {url}")
-
-        payload = {
-            "sys_updated_by": "AI_OPS DEV"
-        }
-
-        # Assignment Group
-        assignment_data = item.get("assignment_Group")
-        if assignment_data:
-            assignment_conf = float(assignment_data.get("Confidence", 0))
-            assignment_pred = assignment_data.get("Prediction")
-            if assignment_conf >= threshold and assignment_pred:
-                payload["assignment_group"] = assignment_pred
-            else:
-                print(f" Skipping assignment group due to low confidence ({assignment_conf})")
-        else:
-            print("Assignment_Group missing.")
-
-        # Category
-        category_data = item.get("category")
-        if category_data:
-            category_conf = float(category_data.get("Confidence", 0))
-            category_pred = category_data.get("Prediction")
-            if category_conf >= threshold and category_pred:
-                payload["category"] = category_pred
-            else:
-                print(f" Skipping category due to low confidence ({category_conf})")
+    # Assignment Group
+    assignment_data = item.get("assignment_Group")
+    if assignment_data:
+        assignment_conf = float(assignment_data.get("Confidence", 0))
+        assignment_pred = assignment_data.get("Prediction")
+        if assignment_conf >= threshold and assignment_pred:
+            payload["assignment_group"] = assignment_pred
         else:
-            print("Category missing.")
-
-        # Subcategory
-        subcategory_data = item.get("subcategory")
-        if subcategory_data:
-            subcategory_conf = float(subcategory_data.get("Confidence", 0))
-            subcategory_pred = subcategory_data.get("Prediction")
-            if subcategory_conf >= threshold and subcategory_pred:
-                payload["subcategory"] = subcategory_pred
-            else:
-                print(f"Skipping subcategory due to low confidence ({subcategory_conf})")
+            logger.debug("Skipping assignment group due to low confidence (%s)", assignment_conf)
+            metrics.inc("ticket_skipped_total", reason="low_confidence", field="assignment_group")
+    else:
+        logger.debug("Assignment_Group missing.")
+
+    # Category
+    category_data = item.get("category")
+    if category_data:
+        category_conf = float(category_data.get("Confidence", 0))
+        category_pred = category_data.get("Prediction")
+        if category_conf >= threshold and category_pred:
+            payload["category"] = category_pred
         else:
-            print("️ Subcategory missing.")
-
-        # Priority
-        priority_data = item.get("priority")
-        if priority_data:
-            priority_conf = float(priority_data.get("Confidence", 0))
-            priority_pred = priority_data.get("Prediction")
-            if priority_conf >= threshold and priority_pred:
-                payload["priority"] = priority_pred
-            else:
-                print(f" Skipping priority due to low confidence ({priority_conf})")
+            logger.debug("Skipping category due to low confidence (%s)", category_conf)
+            metrics.inc("ticket_skipped_total", reason="low_confidence", field="category")
+    else:
+        logger.debug("Category missing.")
+
+    # Subcategory
+    subcategory_data = item.get("subcategory")
+    if subcategory_data:
+        subcategory_conf = float(subcategory_data.get("Confidence", 0))
+        subcategory_pred = subcategory_data.get("Prediction")
+        if subcategory_conf >= threshold and subcategory_pred:
+            payload["subcategory"] = subcategory_pred
         else:
-            print(" Priority missing.")
-
-        # Only update if assignment group confidence is above threshold
-        print("Payload is ", payload)
-        if "assignment_group" in payload:
-            try:
-                response = requests.put(
-                    url,
-                    auth=HTTPBasicAuth(user, pwd),
-                    headers=headers,
-                    json=payload
-                )
-
-                if response.status_code != 200:
-                    print(f" Failed to update incident {incident_number}")
-                    print('Status:', response.status_code)
-                    print('Headers:', response.headers)
-                    print('Error Response:', response.json())
-                    continue
-
-                print(f" Successfully updated incident {incident_number}")
-                #print("Response:", response.json())
-
-            except Exception as e:
-                print(f" Exception occurred while updating incident {incident_number}: {e}")
-                continue
+            logger.debug("Skipping subcategory due to low confidence (%s)", subcategory_conf)
+            metrics.inc("ticket_skipped_total", reason="low_confidence", field="subcategory")
+    else:
+        logger.debug("Subcategory missing.")
+
+    # Priority
+    priority_data = item.get("priority")
+    if priority_data:
+        priority_conf = float(priority_data.get("Confidence", 0))
+        priority_pred = priority_data.get("Prediction")
+        if priority_conf >= threshold and priority_pred:
+            payload["priority"] = priority_pred
         else:
-            print(f"Skipped incident {incident_number} due to missing or low-confidence assignment group.")
+            logger.debug("Skipping priority due to low confidence (%s)", priority_conf)
+            metrics.inc("ticket_skipped_total", reason="low_confidence", field="priority")
+    else:
+        logger.debug("Priority missing.")
+
+    return payload
+
+def update_incident(item, sys_id, session, settings, threshold):
+    """PUT the prediction for one item. Returns the updated record or None."""
+    incident_number = item.get("Incident_ID")
+    timeout = settings["timeout"]
+
+    url = f"{settings['base_url']}incident/{sys_id}"
+    logger.debug("URL: %s", url)
+
+    payload = build_payload(item, threshold)
+
+    # Only update if assignment group confidence is above threshold
+    logger.debug("Payload is %s", payload)
+    if "assignment_group" not in payload:
+        logger.debug("Skipped incident %s due to missing or low-confidence assignment group.", incident_number)
+        return None
+
+    try:
+        with metrics.span("put"):
+            response = session.put(url, json=payload, timeout=timeout)
+
+        if response.status_code != 200:
+            metrics.inc("ticket_http_errors_total", operation="put", status=response.status_code)
+            logger.warning("Failed to update incident %s (status %s): %s",
+                           incident_number, response.status_code, Truncated(response.text))
+            return None
+
+        logger.debug("Successfully updated incident %s", incident_number)
+        return response.json().get("result")
+
+    except Exception as e:
+        metrics.inc("ticket_http_errors_total", operation="put", status="exception")
+        logger.warning("Exception occurred while updating incident %s: %s", incident_number, e)
+        return None
+
+def send_updates(ml_response, incident_list=None):
+    """
+    Write predictions back to ServiceNow.
+
+    sys_ids are taken from incident_list (the payload the predictions came from) when given,
+    otherwise from the LRU cache or a chunked numberIN lookup.
+    Updates run concurrently (max_workers in .env) over one pooled session with per-request
+    timeouts and retry/backoff on 429/5xx. Returns {"result": [updated records]}.
+    """
+    logger.info("Sending updates for %d predictions: %s", len(ml_response), Truncated(ml_response))
+
+    settings = get_settings()
+    threshold = settings["threshold"]
+    session = get_session(settings)
+
+    if incident_list:
+        remember_sys_ids(incident_list.get("result", []))
+
+    items = []
+    for item in ml_response:
+        if not item.get("Incident_ID"):
+            logger.info("Incident_ID missing, skipping item.")
+            continue
+        items.append(item)
+
+    sys_ids = resolve_sys_ids(
+        [item["Incident_ID"] for item in items],
+        settings["base_url"],
+        session,
+        settings["timeout"],
+        chunk_size=int(os.getenv("sys_id_chunk_size", "100"))
+    )
+    items = [item for item in items if sys_ids.get(item["Incident_ID"])]
+
+    def _update(item):
+        return update_incident(item, sys_ids[item["Incident_ID"]], session, settings, threshold)
+
+    with ThreadPoolExecutor(max_workers=settings["max_workers"]) as executor:
+        updated = list(executor.map(_update, items))
 
-    return response.json()
+    return {"result": [record for record in updated if record]}
@@ -1,5 +1,6 @@
 import pandas as pd
 from datetime import datetime
+from report_sink import write_report
 
 # ------------------------
 # Threshold Config
@@ -60,7 +61,7 @@ def gen_report(response):
 
     df = pd.DataFrame(rows)
     report = df.groupby("Date").sum().reset_index()
-    report.to_excel(output_file, index=False)
+    output_file = write_report(report, output_file)
 
     print(f"✅ Analysis report saved as {output_file}")
     return report
@@ -0,0 +1,180 @@
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+
+from List_Incidents import default_query, iter_incident_pages
+from Update_Incident import send_updates
+from kpi_generator import compare_jsons
+from metrics import metrics
+from ml_loader import model_loader
+from watermark import Watermark
+
+# Marks the end of a stage's stream of pages
+_DONE = object()
+
+
+class AsyncPipeline:
+    """
+    One polling cycle as an asyncio pipeline: fetch -> infer -> write-back -> KPI.
+
+    Stages are joined by bounded asyncio queues, so a slow stage holds back the ones before it
+    instead of letting pages pile up in memory. The blocking work of each stage (HTTP calls, model
+    inference, CSV writes) runs in that stage's own thread pool, sized from .env, so network waits
+    and CPU work overlap and a cycle takes about as long as its slowest stage.
+
+    Pages are fetched in order by one task (offset pagination). Later stages may finish pages out of
+    order, so the watermark is only advanced in page order, and never past a page that failed.
+    After the first failure nothing is fetched any more and pages after the failed one are dropped
+    by every stage that has not started on them, so they are not written back twice next cycle.
+    """
+
+    def __init__(self, queue_size=None, infer_concurrency=None, write_concurrency=None, kpi_concurrency=None,
+                 page_size=None):
+        load_dotenv()
+        self.queue_size = int(queue_size or os.getenv("async_queue_size") or os.getenv("pipeline_queue_size", "2"))
+        self.limits = {
+            "infer": int(infer_concurrency or os.getenv("async_infer_concurrency", "1")),
+            "write": int(write_concurrency or os.getenv("async_write_concurrency", "2")),
+            # compare_jsons appends to the daily change log; keep it at 1 unless that is safe
+            "kpi": int(kpi_concurrency or os.getenv("async_kpi_concurrency", "1")),
+        }
+        self.page_size = page_size
+        self.watermark = Watermark()
+        # Sequence number of the earliest failed page in the current cycle (None while all is well)
+        self.failed_seq = None
+
+    def _fail(self, seq):
+        self.failed_seq = seq if self.failed_seq is None else min(self.failed_seq, seq)
+
+    def _dropped(self, seq):
+        """Pages after a failed one are left for the next cycle."""
+        return self.failed_seq is not None and seq > self.failed_seq
+
+    # ------------------------
+    # Stage work (runs in the stage's thread pool)
+    # ------------------------
+    @staticmethod
+    def _infer(item):
+        seq, payload, _ = item
+        return seq, payload, model_loader(payload)
+
+    @staticmethod
+    def _write(item):
+        _, payload, ml_response = item
+        send_updates(ml_response, payload)
+        return item
+
+    @staticmethod
+    def _kpi(item):
+        _, payload, ml_response = item
+        compare_jsons(payload, ml_response)
+        return item
+
+    # ------------------------
+    # Stages
+    # ------------------------
+    async def _fetch(self, outbox, pool, errors):
+        loop = asyncio.get_running_loop()
+        seq = 0
+        try:
+            pages = iter_incident_pages(self.watermark.query(default_query), self.page_size)
+            while self.failed_seq is None:
+                page = await loop.run_in_executor(pool, next, pages, _DONE)
+                if page is _DONE:
+                    break
+                page = self.watermark.filter_new(page)
+                if page:
+                    # Blocks while the queue is full: backpressure from inference
+                    await outbox.put((seq, {"result": page}, None))
+                    seq += 1
+        except Exception as e:
+            logging.exception("Fetch stage failed")
+            errors.append(e)
+            self._fail(seq)
+        finally:
+            await outbox.put(_DONE)
+
+    async def _stage(self, name, work, inbox, outbox, pool, errors):
+        """Run the stage's workers until the inbox is drained, then close the outbox."""
+        loop = asyncio.get_running_loop()
+
+        async def worker():
+            while True:
+                item = await inbox.get()
+                if item is _DONE:
+                    # Put it back so the other workers of this stage stop too
+                    await inbox.put(_DONE)
+                    return
+                if self._dropped(item[0]):
+                    logging.warning("%s stage skipping page %d after a failed page", name, item[0])
+                    continue
+                try:
+                    result = await loop.run_in_executor(pool, work, item)
+                except Exception as e:
+                    logging.exception("%s stage failed on page %d", name, item[0])
+                    errors.append(e)
+                    self._fail(item[0])
+                    continue
+                await outbox.put(result)
+
+        await asyncio.gather(*(worker() for _ in range(self.limits[name])))
+        await outbox.put(_DONE)
+
+    async def _commit(self, inbox):
+        """Advance the watermark in page order as pages come out of the KPI stage."""
+        finished = {}
+        next_seq = 0
+        processed = 0
+        while True:
+            item = await inbox.get()
+            if item is _DONE:
+                break
+            seq, payload, _ = item
+            finished[seq] = payload
+            while next_seq in finished:
+                payload = finished.pop(next_seq)
+                self.watermark.advance(payload["result"]).save()
+                processed += len(payload["result"])
+                next_seq += 1
+
+        if finished:
+            logging.warning("%d page(s) completed after a failed page; they will be picked up again next cycle",
+                            len(finished))
+        return processed
+
+    async def run_cycle(self):
+        """Process every new incident once; returns the number of incidents committed."""
+        to_infer = asyncio.Queue(maxsize=self.queue_size)
+        to_write = asyncio.Queue(maxsize=self.queue_size)
+        to_kpi = asyncio.Queue(maxsize=self.queue_size)
+        to_commit = asyncio.Queue(maxsize=self.queue_size)
+        errors = []
+        self.failed_seq = None
+
+        with ThreadPoolExecutor(1, thread_name_prefix="async-fetch") as fetch_pool, \
+                ThreadPoolExecutor(self.limits["infer"], thread_name_prefix="async-infer") as infer_pool, \
+                ThreadPoolExecutor(self.limits["write"], thread_name_prefix="async-write") as write_pool, \
+                ThreadPoolExecutor(self.limits["kpi"], thread_name_prefix="async-kpi") as kpi_pool:
+            results = await asyncio.gather(
+                self._fetch(to_infer, fetch_pool, errors),
+                self._stage("infer", self._infer, to_infer, to_write, infer_pool, errors),
+                self._stage("write", self._write, to_write, to_kpi, write_pool, errors),
+                self._stage("kpi", self._kpi, to_kpi, to_commit, kpi_pool, errors),
+                self._commit(to_commit),
+            )
+
+        if errors:
+            raise errors[0]
+        return results[-1]
+
+
+def run_async():
+    """python run.py --async: one cycle through the asyncio pipeline."""
+    started = time.perf_counter()
+    processed = asyncio.run(AsyncPipeline().run_cycle())
+    logging.info("Async cycle finished: %d incidents in %.2fs", processed, time.perf_counter() - started)
+    metrics.write_textfile()
+    return processed
@@ -0,0 +1,131 @@
+"""
+Re-score an incident export on every core.
+
+    python backfill.py incidents.jsonl predictions.jsonl
+    python backfill.py export.json predictions.jsonl --workers 8 --chunk-size 2000 --mmap
+
+Input is JSONL (one incident per line, streamed) or JSON ({"result": [...]} or a list).
+Output is JSONL, one prediction per line, in input order.
+"""
+import argparse
+import gc
+import json
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import label_mapper
+from log_config import setup_logging
+from ml_loader import model_loader
+from model_registry import registry
+from prediction_cache import prediction_cache
+
+logger = setup_logging()
+
+
+# ------------------------
+# Input
+# ------------------------
+def iter_incidents(path):
+    """Yield incidents from a JSONL file line by line, or from a JSON export."""
+    with open(path, "r") as f:
+        first = f.read(1)
+        while first and first.isspace():
+            first = f.read(1)
+        f.seek(0)
+
+        if first == "[" or (first == "{" and not path.endswith(".jsonl")):
+            data = json.load(f)
+            yield from data["result"] if isinstance(data, dict) else data
+            return
+
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def iter_chunks(incidents, chunk_size):
+    incidents = iter(incidents)
+    while True:
+        chunk = list(islice(incidents, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+# ------------------------
+# Workers
+# ------------------------
+def _init_worker():
+    # Workers must not race on the shared on-disk prediction cache
+    prediction_cache.path = None
+    # With fork the models are inherited from the parent; with spawn they are loaded here once
+    registry.preload()
+    label_mapper.preload()
+
+
+def _score_chunk(incidents):
+    return model_loader({"result": incidents})
+
+
+def run_backfill(input_path, output_path, workers=None, chunk_size=1000, mmap_mode=None, max_inflight=None):
+    workers = workers or os.cpu_count() or 1
+    max_inflight = max_inflight or workers * 2
+    if mmap_mode:
+        registry.mmap_mode = mmap_mode
+
+    # Load everything in the parent, then fork: workers share the model pages copy-on-write.
+    # gc.freeze keeps the workers' collections from touching (and copying) those pages.
+    registry.preload()
+    label_mapper.preload()
+    gc.freeze()
+
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("fork" if "fork" in methods else None)
+
+    started = time.perf_counter()
+    scored = 0
+    submitted = 0
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker) as pool, \
+            open(output_path, "w") as out:
+        pending = deque()
+
+        def drain(limit):
+            nonlocal scored
+            while len(pending) > limit:
+                for prediction in pending.popleft().result():
+                    out.write(json.dumps(prediction, default=str) + "\n")
+                    scored += 1
+
+        # Bounded window of in-flight chunks: results are written in input order and the
+        # input is never fully materialised
+        for chunk in iter_chunks(iter_incidents(input_path), chunk_size):
+            pending.append(pool.submit(_score_chunk, chunk))
+            submitted += len(chunk)
+            drain(max_inflight)
+        drain(0)
+
+    elapsed = time.perf_counter() - started
+    logger.info("Backfill scored %d of %d incidents in %.1fs (%.0f/s) with %d workers",
+                scored, submitted, elapsed, scored / elapsed if elapsed else 0, workers)
+    return scored
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-process re-scoring of an incident export.")
+    parser.add_argument("input", help="Incident export (.jsonl, or .json with a 'result' list)")
+    parser.add_argument("output", help="Predictions output (.jsonl)")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="Incidents per task")
+    parser.add_argument("--mmap", action="store_true", help="Memory-map model arrays (uncompressed joblib dumps)")
+    args = parser.parse_args()
+
+    run_backfill(args.input, args.output, args.workers, args.chunk_size, "r" if args.mmap else None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+"""
+Throughput / latency benchmark for the prediction pipeline.
+
+    python benchmark.py                                  # 1, 100, 10k, 100k incidents
+    python benchmark.py --sizes 1 100 --repeat 20
+    python benchmark.py --save benchmarks/baseline.json  # record a baseline
+    python benchmark.py --compare benchmarks/baseline.json
+
+Payloads are synthetic ServiceNow responses shaped like "Incident_API response.txt".
+Stages follow the path model_loader takes for each size: up to fast_path_max_batch incidents the
+compiled scorers (compiled_<model>), above it the shared-encoder batch path (encode_<models> once,
+then head_<model> per model; model_<model> for models that keep their own pipeline).
+"""
+import argparse
+import copy
+import json
+import logging
+import os
+import random
+import subprocess
+import time
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+import ml_loader
+from fast_scorer import FAST_PATH_MAX_BATCH, UnknownCategory, get_fast_scorer
+from features import build_feature_frame, build_feature_row
+from label_mapper import map_labels
+from ml_loader import build_features, build_result
+from model_registry import get_model, registry
+from multi_head import get_multi_head
+from prediction_cache import prediction_cache
+
+SAMPLE_FILE = "Incident_API response.txt"
+DEFAULT_SIZES = [1, 100, 10000, 100000]
+MODELS = ["assignment_group", "category", "subcategory"]
+# Relative slowdown of a stage before --compare calls it a regression
+REGRESSION_TOLERANCE = 0.10
+
+
+# ------------------------
+# Synthetic payloads
+# ------------------------
+def load_template():
+    with open(SAMPLE_FILE, "r") as f:
+        text_data = f.read()
+    return json.loads(text_data[text_data.find("{"):])["result"][0]
+
+
+def generate_payload(size, seed=42, template=None):
+    """ServiceNow-style {"result": [...]} with `size` varied incidents."""
+    rng = random.Random(seed)
+    template = template or load_template()
+    users = [f"{rng.getrandbits(128):032x}" for _ in range(max(10, size // 20))]
+    locations = ["in.tn.chennai.1.zenith building", "au.wa.perth.1.240 st georges tce", "gb.abz.aberdeen.1.sir ian wood house", ""]
+    cis = ["generic", "outlook", "vpn", "laptop", ""]
+    categories = ["", "software", "hardware", "network", "inquiry"]
+    start = datetime(2025, 1, 1)
+
+    result = []
+    for i in range(size):
+        incident = copy.deepcopy(template)
+        caller = rng.choice(users)
+        opened_at = (start + timedelta(minutes=rng.randrange(0, 365 * 24 * 60))).strftime("%Y-%m-%d %H:%M:%S")
+        incident.update({
+            "number": f"INC{i:07d}",
+            "task_effective_number": f"INC{i:07d}",
+            "sys_id": f"{rng.getrandbits(128):032x}",
+            "opened_at": opened_at,
+            "sys_created_on": opened_at,
+            "caller_id": {"link": "", "value": caller},
+            "opened_by": {"link": "", "value": rng.choice([caller, rng.choice(users)])},
+            "location": rng.choice(locations),
+            "cmdb_ci": rng.choice(cis),
+            "category": rng.choice(categories),
+            "impact": str(rng.randint(1, 3)),
+            "urgency": str(rng.randint(1, 3)),
+            "priority": str(rng.randint(1, 5)),
+        })
+        result.append(incident)
+    return {"result": result}
+
+
+# ------------------------
+# Measurement helpers
+# ------------------------
+def peak_rss_mb():
+    try:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    except ImportError:
+        return None
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def timed(timings, stage, func, *args):
+    start = time.perf_counter()
+    value = func(*args)
+    timings.setdefault(stage, []).append(time.perf_counter() - start)
+    return value
+
+
+def uses_compiled_path(size):
+    """model_loader scores batches up to FAST_PATH_MAX_BATCH with the compiled scorers when all compiled."""
+    return 0 < size <= FAST_PATH_MAX_BATCH and all(get_fast_scorer(name) for name in MODELS)
+
+
+def label_mapping(predictions):
+    categories = map_labels(ml_loader.cat_excel_file, ml_loader.search_column, ml_loader.target_column,
+                            [prediction["category"][0] for prediction in predictions])
+    subcategories = map_labels(ml_loader.subcat_excel_file, ml_loader.search_column, ml_loader.target_column,
+                               [prediction["subcategory"][0] for prediction in predictions])
+    return categories, subcategories
+
+
+def result_assembly(incidents, predictions, categories, subcategories):
+    return [
+        build_result(
+            incident,
+            tuple(prediction["assignment_group"]),
+            (category, prediction["category"][1]),
+            (subcategory, prediction["subcategory"][1])
+        )
+        for incident, prediction, category, subcategory in zip(incidents, predictions, categories, subcategories)
+    ]
+
+
+def run_compiled_stages(incidents, timings):
+    """One pass of model_loader's small-batch path (compiled scorers), timed stage by stage."""
+    def feature_build():
+        kept, rows = [], []
+        for incident in incidents:
+            row = build_feature_row(incident)
+            if row is not None:
+                kept.append(incident)
+                rows.append(row)
+        return kept, rows
+
+    kept, rows = timed(timings, "feature_build", feature_build)
+    probas = {}
+    for name in MODELS:
+        def score(name=name):
+            try:
+                return get_fast_scorer(name).predict_proba(rows)
+            except UnknownCategory:
+                return get_model(name).predict_proba(pd.DataFrame(rows))
+        probas[name] = timed(timings, f"compiled_{name}", score)
+    return kept, probas
+
+
+def run_batch_stages(incidents, timings):
+    """One pass of model_loader's batch path (shared encoders, one head per model), timed stage by stage."""
+    def feature_build_dict():
+        rows = [build_features(incident) for incident in incidents]
+        return pd.DataFrame([row for row in rows if row is not None])
+
+    # The per-dict path is kept as the reference the columnar builder is compared against
+    timed(timings, "feature_build_dict", feature_build_dict)
+    df_batch, kept = timed(timings, "feature_build", build_feature_frame, incidents)
+
+    scorer = get_multi_head(MODELS)
+    probas = {}
+    for names in scorer.groups:
+        if len(names) == 1:
+            name = names[0]
+            probas[name] = timed(timings, f"model_{name}", scorer.models[name].predict_proba, df_batch)
+            continue
+        # Same split as MultiHeadScorer.predict_proba: encode once, then each model's final estimator
+        encoded = timed(timings, f"encode_{'+'.join(names)}", scorer.models[names[0]][:-1].transform, df_batch)
+        for name in names:
+            probas[name] = timed(timings, f"head_{name}", scorer.models[name][-1].predict_proba, encoded)
+    return [incidents[position] for position in kept], probas
+
+
+def run_stages(payload, timings):
+    """One pass of the path model_loader takes for this payload size, timed stage by stage."""
+    incidents = payload["result"]
+    if uses_compiled_path(len(incidents)):
+        kept, probas = run_compiled_stages(incidents, timings)
+    else:
+        kept, probas = run_batch_stages(incidents, timings)
+
+    predictions = timed(timings, "decode", ml_loader.decode_predictions, probas)
+    categories, subcategories = timed(timings, "label_mapping", label_mapping, predictions)
+    timed(timings, "result_assembly", result_assembly, kept, predictions, categories, subcategories)
+
+
+def benchmark_size(size, repeat, seed):
+    payload = generate_payload(size, seed)
+    timings = {}
+    end_to_end = []
+
+    # Warm-up so one-off costs (lazy imports, first sklearn call) do not skew the numbers
+    ml_loader.model_loader(payload)
+
+    for _ in range(repeat):
+        run_stages(payload, timings)
+        start = time.perf_counter()
+        ml_loader.model_loader(payload)
+        end_to_end.append(time.perf_counter() - start)
+
+    stages = {
+        stage: {"p50_ms": percentile(values, 50) * 1000, "p99_ms": percentile(values, 99) * 1000}
+        for stage, values in timings.items()
+    }
+    p50 = percentile(end_to_end, 50)
+    return {
+        "size": size,
+        "path": "compiled" if uses_compiled_path(size) else "batch",
+        "repeat": repeat,
+        "p50_ms": p50 * 1000,
+        "p99_ms": percentile(end_to_end, 99) * 1000,
+        "per_incident_p50_ms": p50 * 1000 / size,
+        "throughput_per_s": size / p50 if p50 else None,
+        "peak_rss_mb": peak_rss_mb(),
+        "stages": stages,
+    }
+
+
+# ------------------------
+# Baselines
+# ------------------------
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path):
+    with open(baseline_path, "r") as f:
+        baseline = json.load(f)
+    previous = {run["size"]: run for run in baseline["runs"]}
+    regressions = 0
+
+    print(f"\nComparison against {baseline_path} (commit {baseline.get('commit')}):")
+    for run in results["runs"]:
+        old = previous.get(run["size"])
+        if not old:
+            continue
+        pairs = [("end_to_end", old["p50_ms"], run["p50_ms"])]
+        pairs += [(stage, old["stages"][stage]["p50_ms"], stats["p50_ms"])
+                  for stage, stats in run["stages"].items() if stage in old.get("stages", {})]
+        for stage, before, after in pairs:
+            change = (after - before) / before if before else 0.0
+            flag = "REGRESSION" if change > REGRESSION_TOLERANCE else ""
+            regressions += bool(flag)
+            print(f"  n={run['size']:<7} {stage:<26} {before:10.2f} ms -> {after:10.2f} ms  {change:+7.1%} {flag}")
+    return regressions
+
+
+def print_results(results):
+    for run in results["runs"]:
+        print(f"\nn={run['size']} ({run.get('path', 'batch')} path)  p50={run['p50_ms']:.2f} ms  p99={run['p99_ms']:.2f} ms  "
+              f"throughput={run['throughput_per_s']:.0f}/s  peak RSS={run['peak_rss_mb']} MB")
+        for stage, stats in run["stages"].items():
+            print(f"    {stage:<26} p50={stats['p50_ms']:10.2f} ms  p99={stats['p99_ms']:10.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the model_loader pipeline.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--save", help="Write results as a baseline JSON file")
+    parser.add_argument("--compare", help="Compare against a saved baseline JSON file")
+    args = parser.parse_args()
+
+    # Keep payload logging and the prediction cache out of the measurements
+    logging.getLogger().setLevel(logging.WARNING)
+    prediction_cache.maxsize = 0
+    registry.preload()
+
+    results = {
+        "commit": git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "runs": [benchmark_size(size, args.repeat, args.seed) for size in args.sizes],
+    }
+    print_results(results)
+
+    if args.save:
+        os.makedirs(os.path.dirname(args.save) or ".", exist_ok=True)
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nBaseline saved to {args.save}")
+
+    if args.compare:
+        regressions = compare(results, args.compare)
+        if regressions:
+            raise SystemExit(f"{regressions} stage(s) regressed by more than {REGRESSION_TOLERANCE:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+import os
+from datetime import date, datetime
+import pandas as pd
+from dotenv import load_dotenv
+
+load_dotenv()
+CHANGE_LOG_DIR = os.getenv("change_log_dir", "incident_changes")
+LEGACY_FILE = "incident_changes.csv"
+# Rows keep the "%d-%m-%Y" Date column of incident_changes.csv; partitions use ISO dates so they sort
+ROW_DATE_FORMAT = "%d-%m-%Y"
+PARTITION_PREFIX = "date="
+
+
+def _to_date(value):
+    if value is None or (isinstance(value, date) and not isinstance(value, datetime)):
+        return value
+    if isinstance(value, datetime):
+        return value.date()
+    for fmt in ("%Y-%m-%d", ROW_DATE_FORMAT):
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    raise ValueError(f"Unrecognised date '{value}', expected YYYY-MM-DD or DD-MM-YYYY")
+
+
+def partition_path(day, base_dir=CHANGE_LOG_DIR):
+    return os.path.join(base_dir, f"{PARTITION_PREFIX}{_to_date(day).isoformat()}.csv")
+
+
+def append_changes(changes_df, day=None, base_dir=CHANGE_LOG_DIR):
+    """
+    Append one cycle's comparison rows to that day's partition.
+    The header is written only when the partition is created, so cost is independent of history size.
+    """
+    if changes_df is None or changes_df.empty:
+        return None
+
+    day = _to_date(day) or date.today()
+    os.makedirs(base_dir, exist_ok=True)
+    path = partition_path(day, base_dir)
+    write_header = not os.path.exists(path) or os.path.getsize(path) == 0
+    changes_df.to_csv(path, mode="a", header=write_header, index=False)
+    return path
+
+
+def list_partitions(start=None, end=None, base_dir=CHANGE_LOG_DIR):
+    """Partition files whose date falls in [start, end], oldest first."""
+    if not os.path.isdir(base_dir):
+        return []
+
+    start, end = _to_date(start), _to_date(end)
+    partitions = []
+    for name in sorted(os.listdir(base_dir)):
+        if not name.startswith(PARTITION_PREFIX) or not name.endswith(".csv"):
+            continue
+        day = _to_date(name[len(PARTITION_PREFIX):-len(".csv")])
+        if (start and day < start) or (end and day > end):
+            continue
+        partitions.append(os.path.join(base_dir, name))
+    return partitions
+
+
+def _read_legacy(start=None, end=None, legacy_file=LEGACY_FILE):
+    """Rows of the old single incident_changes.csv inside [start, end], until it has been migrated."""
+    if not os.path.exists(legacy_file):
+        return None
+
+    df = pd.read_csv(legacy_file)
+    start, end = _to_date(start), _to_date(end)
+    if start or end:
+        days = pd.to_datetime(df["Date"], format=ROW_DATE_FORMAT, errors="coerce")
+        keep = days.notna()
+        if start:
+            keep &= days >= pd.Timestamp(start)
+        if end:
+            keep &= days <= pd.Timestamp(end)
+        df = df[keep]
+    return df
+
+
+def query_changes(start=None, end=None, incident=None, base_dir=CHANGE_LOG_DIR, legacy_file=LEGACY_FILE):
+    """
+    Read change rows for a date range (inclusive), optionally for a single incident.
+    Only the partitions inside the range are opened. History still in the legacy single file
+    (not yet split by migrate_legacy_csv) is included, oldest first.
+    """
+    frames = []
+    legacy_df = _read_legacy(start, end, legacy_file) if legacy_file else None
+    if legacy_df is not None:
+        frames.append(legacy_df)
+    for path in list_partitions(start, end, base_dir):
+        frames.append(pd.read_csv(path))
+    if incident is not None:
+        frames = [df[df["Incident"] == incident] for df in frames]
+
+    if not frames:
+        return pd.DataFrame(columns=["Date", "Incident", "Priority", "Category", "Subcategory",
+                                     "Assignment_Group", "Global Change"])
+    return pd.concat(frames, ignore_index=True)
+
+
+def migrate_legacy_csv(legacy_file=LEGACY_FILE, base_dir=CHANGE_LOG_DIR):
+    """
+    One-off: split the old single incident_changes.csv into daily partitions.
+    The legacy file is then renamed to <name>.migrated so query_changes does not count its rows twice.
+    """
+    if not os.path.exists(legacy_file):
+        return 0
+
+    legacy_df = pd.read_csv(legacy_file)
+    for day, rows in legacy_df.groupby("Date", sort=False):
+        append_changes(rows, day=day, base_dir=base_dir)
+    os.replace(legacy_file, f"{legacy_file}.migrated")
+    print(f"Migrated {len(legacy_df)} rows from '{legacy_file}' into '{base_dir}'.")
+    return len(legacy_df)
@@ -0,0 +1,394 @@
+"""
+Compiled scoring for small batches.
+
+A fitted Pipeline (ColumnTransformer of OneHotEncoder / OrdinalEncoder / StandardScaler / passthrough
+or nested Pipelines, followed by a classifier) is flattened into plain category -> index dicts and one
+numpy matrix handed straight to the final estimator's predict_proba. No DataFrame is built and no
+per-step validation runs, which is where most of the time goes for a single ticket.
+
+Every compiled model is checked against its pipeline on a sample before it is used; anything the
+compiler does not understand, or that fails the check, keeps using the pipeline.
+
+    python fast_scorer.py    # compile every model, check parity and compare single-ticket latency
+"""
+import json
+import logging
+import os
+import random
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+from sklearn.compose import ColumnTransformer
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import OneHotEncoder, OrdinalEncoder, StandardScaler
+
+from features import FEATURE_COLUMNS, build_feature_row
+from model_registry import registry
+
+load_dotenv()
+# Batches up to this many incidents use the compiled scorers (0 disables the fast path)
+FAST_PATH_MAX_BATCH = int(os.getenv("fast_path_max_batch", "32"))
+# Synthetic rows scored by both the pipeline and the compiled scorer before it is trusted
+PARITY_SAMPLE_SIZE = int(os.getenv("fast_path_parity_rows", "256"))
+
+SAMPLE_FILE = "Incident_API response.txt"
+UNSEEN_VALUE = "__unseen__"
+_MISSING = object()
+
+
+class UnsupportedPipeline(ValueError):
+    """The pipeline contains a step the compiler cannot reproduce exactly."""
+
+
+class UnknownCategory(ValueError):
+    """A value was not seen in training and the encoder is configured to raise on it."""
+
+
+def _as_matrix(block):
+    if isinstance(block, np.ndarray):
+        return block
+    n = len(block[0]) if block else 0
+    return np.column_stack([np.asarray(column, dtype=np.float64) for column in block]) if block else np.empty((n, 0))
+
+
+def _as_columns(block):
+    if isinstance(block, np.ndarray):
+        return [block[:, j] for j in range(block.shape[1])]
+    return block
+
+
+# ------------------------
+# Compiled steps
+# ------------------------
+class _OneHot:
+    def __init__(self, encoder):
+        if getattr(encoder, "_infrequent_enabled", False):
+            raise UnsupportedPipeline("OneHotEncoder with infrequent categories")
+        self.handle_unknown = encoder.handle_unknown
+        drop_idx = getattr(encoder, "drop_idx_", None)
+
+        self.lookups, self.offsets = [], []
+        width = 0
+        for j, categories in enumerate(encoder.categories_):
+            dropped = None if drop_idx is None else drop_idx[j]
+            lookup, position = {}, 0
+            for k, value in enumerate(categories.tolist()):
+                if dropped is not None and k == dropped:
+                    lookup[value] = None
+                    continue
+                lookup[value] = position
+                position += 1
+            self.lookups.append(lookup)
+            self.offsets.append(width)
+            width += position
+        self.width = width
+
+    def known_values(self):
+        return [(list(lookup), self.handle_unknown != "error") for lookup in self.lookups]
+
+    def transform(self, block):
+        columns = _as_columns(block)
+        out = np.zeros((len(columns[0]) if columns else 0, self.width))
+        for j, column in enumerate(columns):
+            lookup, offset = self.lookups[j], self.offsets[j]
+            for i, value in enumerate(column):
+                index = lookup.get(value, _MISSING)
+                if index is _MISSING:
+                    if self.handle_unknown == "error":
+                        raise UnknownCategory(f"Unknown category {value!r} in column {j}")
+                    continue
+                if index is not None:
+                    out[i, offset + index] = 1.0
+        return out
+
+
+class _Ordinal:
+    def __init__(self, encoder):
+        if getattr(encoder, "_infrequent_enabled", False):
+            raise UnsupportedPipeline("OrdinalEncoder with infrequent categories")
+        self.unknown_value = encoder.unknown_value if encoder.handle_unknown == "use_encoded_value" else _MISSING
+        self.lookups = [{value: float(k) for k, value in enumerate(categories.tolist())}
+                        for categories in encoder.categories_]
+
+    def known_values(self):
+        return [(list(lookup), self.unknown_value is not _MISSING) for lookup in self.lookups]
+
+    def transform(self, block):
+        columns = _as_columns(block)
+        out = np.empty((len(columns[0]) if columns else 0, len(columns)))
+        for j, column in enumerate(columns):
+            lookup = self.lookups[j]
+            for i, value in enumerate(column):
+                code = lookup.get(value, self.unknown_value)
+                if code is _MISSING:
+                    raise UnknownCategory(f"Unknown category {value!r} in column {j}")
+                out[i, j] = code
+        return out
+
+
+class _Scaler:
+    def __init__(self, scaler):
+        self.mean = scaler.mean_ if scaler.with_mean else None
+        self.scale = scaler.scale_ if scaler.with_std else None
+
+    def known_values(self):
+        return None
+
+    def transform(self, block):
+        # Same operations in the same order as StandardScaler.transform, so results are bit-identical
+        matrix = np.array(_as_matrix(block), dtype=np.float64)
+        if self.mean is not None:
+            matrix -= self.mean
+        if self.scale is not None:
+            matrix /= self.scale
+        return matrix
+
+
+class _Passthrough:
+    def known_values(self):
+        return None
+
+    def transform(self, block):
+        return block
+
+
+class _Chain:
+    def __init__(self, steps):
+        self.steps = steps
+
+    def known_values(self):
+        return self.steps[0].known_values() if self.steps else None
+
+    def transform(self, block):
+        for step in self.steps:
+            block = step.transform(block)
+        return block
+
+
+class _Columns:
+    """ColumnTransformer: each branch gets its own input columns, outputs are stacked side by side."""
+
+    def __init__(self, transformer):
+        names = getattr(transformer, "feature_names_in_", None)
+        self.branches = []
+        for _, step, columns in transformer.transformers_:
+            if isinstance(step, str) and step == "drop":
+                continue
+            columns = _resolve_columns(columns, names)
+            if columns:
+                self.branches.append((columns, _compile_step(step)))
+
+    def input_columns(self):
+        seen = []
+        for columns, _ in self.branches:
+            seen.extend(column for column in columns if column not in seen)
+        return seen
+
+    def known_values(self):
+        values = {}
+        for columns, step in self.branches:
+            for column, known in zip(columns, step.known_values() or []):
+                values.setdefault(column, known)
+        return values
+
+    def transform_columns(self, frame_columns):
+        n = len(next(iter(frame_columns.values()))) if frame_columns else 0
+        outputs = [_as_matrix(step.transform([frame_columns[c] for c in columns])) for columns, step in self.branches]
+        return np.hstack(outputs) if outputs else np.empty((n, 0))
+
+
+def _resolve_columns(columns, names):
+    if callable(columns) or isinstance(columns, str):
+        # A scalar column name hands the transformer a 1-D array; not worth reproducing
+        raise UnsupportedPipeline(f"Column selector {columns!r}")
+    if isinstance(columns, slice) or (len(columns) and not isinstance(columns[0], str)):
+        if names is None:
+            raise UnsupportedPipeline("Positional columns on a transformer fitted without column names")
+        selected = np.asarray(names)[columns]
+        return [str(name) for name in np.atleast_1d(selected)]
+    return [str(column) for column in columns]
+
+
+def _compile_step(step):
+    if step is None or (isinstance(step, str) and step == "passthrough"):
+        return _Passthrough()
+    if isinstance(step, Pipeline):
+        return _Chain([_compile_step(s) for _, s in step.steps])
+    if isinstance(step, ColumnTransformer):
+        raise UnsupportedPipeline("ColumnTransformer nested below the first step")
+    if isinstance(step, OneHotEncoder):
+        return _OneHot(step)
+    if isinstance(step, OrdinalEncoder):
+        return _Ordinal(step)
+    if isinstance(step, StandardScaler):
+        return _Scaler(step)
+    raise UnsupportedPipeline(f"Unsupported step {type(step).__name__}")
+
+
+# ------------------------
+# Compiled pipeline
+# ------------------------
+class CompiledPipeline:
+    """Lean stand-in for a fitted Pipeline: same classes_, same predict_proba, no DataFrame needed."""
+
+    def __init__(self, pipeline):
+        if not isinstance(pipeline, Pipeline):
+            raise UnsupportedPipeline(f"Expected a Pipeline, got {type(pipeline).__name__}")
+        estimator = pipeline.steps[-1][1]
+        if not hasattr(estimator, "predict_proba"):
+            raise UnsupportedPipeline("Final step has no predict_proba")
+
+        transformers = [step for _, step in pipeline.steps[:-1]]
+        if transformers and isinstance(transformers[0], ColumnTransformer):
+            self.columns = _Columns(transformers[0])
+            transformers = transformers[1:]
+            self.input_columns = self.columns.input_columns()
+        else:
+            self.columns = None
+            names = getattr(pipeline, "feature_names_in_", None)
+            self.input_columns = [str(name) for name in names] if names is not None else list(FEATURE_COLUMNS)
+
+        self.steps = [_compile_step(step) for step in transformers]
+        self.estimator = estimator
+        self.classes_ = pipeline.classes_
+
+    def known_values(self):
+        """Input column -> (known categories, unseen values accepted) for the encoded columns."""
+        if self.columns is not None:
+            return self.columns.known_values()
+        first = self.steps[0].known_values() if self.steps else None
+        return dict(zip(self.input_columns, first or []))
+
+    def transform_rows(self, rows):
+        frame_columns = {column: [row[column] for row in rows] for column in self.input_columns}
+        if self.columns is not None:
+            block = self.columns.transform_columns(frame_columns)
+        else:
+            block = [frame_columns[column] for column in self.input_columns]
+        for step in self.steps:
+            block = step.transform(block)
+        return _as_matrix(block)
+
+    def predict_proba_rows(self, rows):
+        """predict_proba for a list of feature dicts (as built by features.build_feature_row)."""
+        return self.estimator.predict_proba(self.transform_rows(rows))
+
+    def predict_proba(self, X):
+        """Accepts a feature DataFrame or a list of feature dicts."""
+        if isinstance(X, pd.DataFrame):
+            X = X.to_dict("records")
+        return self.predict_proba_rows(X)
+
+
+def compile_pipeline(pipeline):
+    return CompiledPipeline(pipeline)
+
+
+# ------------------------
+# Parity check
+# ------------------------
+def load_sample_rows(path=SAMPLE_FILE):
+    if not os.path.exists(path):
+        return []
+    with open(path, "r") as f:
+        text_data = f.read()
+    incidents = json.loads(text_data[text_data.find("{"):])["result"]
+    return [row for row in (build_feature_row(incident) for incident in incidents) if row is not None]
+
+
+def parity_sample(scorer, size=PARITY_SAMPLE_SIZE, seed=0, base_rows=None):
+    """
+    Feature rows for the parity check: the sample incidents, plus synthetic rows that draw every
+    encoded column from the encoder's own categories (and unseen values where the encoder allows them).
+    """
+    base_rows = load_sample_rows() if base_rows is None else base_rows
+    if not base_rows:
+        raise UnsupportedPipeline("No sample incidents to check parity on")
+
+    rng = random.Random(seed)
+    known = scorer.known_values()
+    rows = [dict(row) for row in base_rows]
+    for i in range(size):
+        row = dict(base_rows[i % len(base_rows)])
+        for column, (values, accepts_unknown) in known.items():
+            if accepts_unknown and rng.random() < 0.05:
+                row[column] = UNSEEN_VALUE if values and isinstance(values[0], str) else -1
+            elif values:
+                row[column] = rng.choice(values)
+        rows.append(row)
+    return rows
+
+
+def check_parity(scorer, pipeline, rows, rtol=1e-9, atol=1e-12):
+    """True when the compiled scorer reproduces pipeline.predict_proba (and its argmax) on the rows."""
+    expected = pipeline.predict_proba(pd.DataFrame(rows, columns=FEATURE_COLUMNS))
+    actual = scorer.predict_proba_rows(rows)
+    return (expected.shape == actual.shape
+            and np.allclose(expected, actual, rtol=rtol, atol=atol)
+            and (expected.argmax(axis=1) == actual.argmax(axis=1)).all())
+
+
+# ------------------------
+# Per-model scorers, compiled and checked on first use
+# ------------------------
+_scorers = {}
+_lock = threading.Lock()
+
+
+def get_fast_scorer(name):
+    """Checked CompiledPipeline for a registry model, or None when it has to use the pipeline."""
+    pipeline = registry.get(name)
+    cached = _scorers.get(name)
+    if cached is not None and cached[0] is pipeline:
+        return cached[1]
+
+    with _lock:
+        cached = _scorers.get(name)
+        if cached is not None and cached[0] is pipeline:
+            return cached[1]
+        try:
+            scorer = compile_pipeline(pipeline)
+            if not check_parity(scorer, pipeline, parity_sample(scorer)):
+                raise UnsupportedPipeline("predict_proba differs from the pipeline on the parity sample")
+            logging.info("Compiled fast scorer for '%s'", name)
+        except (UnsupportedPipeline, UnknownCategory, ValueError, TypeError) as e:
+            logging.warning("Fast scorer disabled for '%s', using the pipeline: %s", name, e)
+            scorer = None
+        _scorers[name] = (pipeline, scorer)
+    return scorer
+
+
+def preload():
+    """Compile and check every model now (e.g. before gunicorn forks) instead of on the first small batch."""
+    if FAST_PATH_MAX_BATCH > 0:
+        for name in registry.model_files:
+            get_fast_scorer(name)
+
+
+def main():
+    logging.getLogger().setLevel(logging.WARNING)
+    rows = load_sample_rows()[:1]
+    for name in registry.model_files:
+        pipeline = registry.get(name)
+        scorer = get_fast_scorer(name)
+        if scorer is None or not rows:
+            print(f"{name:<18} not compiled (pipeline is used)")
+            continue
+
+        frame = pd.DataFrame(rows, columns=FEATURE_COLUMNS)
+        timings = {}
+        for label, func in [("pipeline", lambda: pipeline.predict_proba(frame)),
+                            ("compiled", lambda: scorer.predict_proba_rows(rows))]:
+            start = time.perf_counter()
+            for _ in range(200):
+                func()
+            timings[label] = (time.perf_counter() - start) / 200 * 1000
+        print(f"{name:<18} parity ok  single ticket: pipeline {timings['pipeline']:.3f} ms, "
+              f"compiled {timings['compiled']:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
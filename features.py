@@ -0,0 +1,162 @@
+import logging
+from datetime import datetime
+
+import pandas as pd
+
+from log_config import Truncated
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+OPENED_AT_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# ServiceNow priority codes -> "pN - ..." labels, for models trained on mapped priorities (preprocessing_v2).
+# The registry models were fitted on the raw lowercased value, so the default encoding leaves codes as they are.
+PRIORITY_MAP = {
+    "1": "p1 - critical",
+    "2": "p2 - high",
+    "3": "p3 - medium",
+    "4": "p4 - low",
+    "5": "p5 - planning"
+}
+
+# Model column -> (incident field, default) for the plain string features
+STRING_FEATURES = {
+    "Subcategory": ("subcategory", "unknown"),
+    "Category": ("category", "unknown"),
+    "Configuration item": ("cmdb_ci", "generic"),
+    "Location": ("location", "unknown"),
+    "Business unit": ("business_unit", "wood - operations"),
+    "Legal Entity": ("company", "wood group psn australia pty limited"),
+    "Team Classfication": ("team_classification", "gsd"),
+}
+
+# Column order the pipelines were fitted with
+FEATURE_COLUMNS = [
+    "Subcategory", "Category", "Priority", "Configuration item", "Location", "Business unit",
+    "Legal Entity", "Reported By", "Opened by", "Hour", "Week Day", "Opened Month", "Opened Year",
+    "Team Classfication"
+]
+
+# High-cardinality columns that can be stored as pandas categoricals (build_feature_frame(categorical=True))
+CATEGORICAL_COLUMNS = ["Reported By", "Opened by", "Location"]
+
+
+# ------------------------
+# Helper: normalize safely
+# ------------------------
+def safe_val(v, default="unknown"):
+    if v is None:
+        return default
+    if isinstance(v, str):
+        v = v.strip()
+        return v.lower() if v else default
+    return str(v).lower() if v else default
+
+
+def normalize_priority(v, priority_map=None):
+    """
+    Priority feature value. By default the raw value, normalized (what the registry models were fitted on);
+    with a priority_map, codes are mapped through it and anything else becomes "p3 - medium".
+    """
+    if priority_map is None:
+        return safe_val(v, "p3 - medium")
+    code = str(v).strip() if v is not None else ""
+    return priority_map.get(code, "p3 - medium")
+
+
+def reference_value(incident, field):
+    """
+    Value of a reference field such as caller_id / opened_by.
+    Returns None (and counts the skip) when the field is not a {"value": ...} dict.
+    """
+    ref = incident.get(field)
+    if not isinstance(ref, dict) or "value" not in ref:
+        logger.info("⚠️ Skipping incident due to malformed %s: %s", field, Truncated(ref))
+        metrics.inc("ticket_skipped_total", reason=f"malformed_{field}")
+        return None
+    return ref["value"]
+
+
+def parse_opened_at(opened_at):
+    try:
+        return datetime.strptime(opened_at, OPENED_AT_FORMAT) if opened_at else datetime.now()
+    except (TypeError, ValueError):
+        return datetime.now()
+
+
+# ------------------------
+# Row path (one dict per incident)
+# ------------------------
+def build_feature_row(incident, priority_map=None):
+    """Feature dict for one incident, or None when caller_id / opened_by are malformed."""
+    caller = reference_value(incident, "caller_id")
+    if caller is None:
+        return None
+    opened_by = reference_value(incident, "opened_by")
+    if opened_by is None:
+        return None
+
+    dt = parse_opened_at(incident.get("opened_at"))
+    row = {column: safe_val(incident.get(field), default) for column, (field, default) in STRING_FEATURES.items()}
+    row.update({
+        "Priority": normalize_priority(incident.get("priority"), priority_map),
+        "Reported By": safe_val(caller),
+        "Opened by": safe_val(opened_by),
+        "Hour": dt.hour,
+        "Week Day": dt.weekday(),
+        "Opened Month": dt.month,
+        "Opened Year": dt.year,
+    })
+    return {column: row[column] for column in FEATURE_COLUMNS}
+
+
+# ------------------------
+# Columnar path (whole batch at once)
+# ------------------------
+def build_feature_frame(incidents, categorical=False, priority_map=None):
+    """
+    Typed feature frame for a list of raw incidents, built in one pass.
+
+    Returns (frame, kept) where kept are the positions of the incidents that made it into the
+    frame (malformed caller_id / opened_by are skipped). Datetimes are parsed in one vectorized
+    call. Values and dtypes match the row path; categorical=True stores CATEGORICAL_COLUMNS as
+    pandas categoricals, only for models fitted on such a frame.
+    """
+    columns = {column: [] for column in STRING_FEATURES}
+    priorities, callers, openers, opened_at, kept = [], [], [], [], []
+
+    for position, incident in enumerate(incidents):
+        caller = reference_value(incident, "caller_id")
+        if caller is None:
+            continue
+        opened_by = reference_value(incident, "opened_by")
+        if opened_by is None:
+            continue
+
+        kept.append(position)
+        for column, (field, default) in STRING_FEATURES.items():
+            columns[column].append(safe_val(incident.get(field), default))
+        priorities.append(normalize_priority(incident.get("priority"), priority_map))
+        callers.append(safe_val(caller))
+        openers.append(safe_val(opened_by))
+        opened_at.append(incident.get("opened_at") or None)
+
+    # Bulk datetime parse; missing or unparsable timestamps fall back to now, as in the row path
+    dt = pd.to_datetime(pd.Series(opened_at, dtype=object), format=OPENED_AT_FORMAT, errors="coerce")
+    dt = dt.fillna(pd.Timestamp(datetime.now()))
+
+    frame = pd.DataFrame(columns)
+    frame["Priority"] = priorities
+    frame["Reported By"] = callers
+    frame["Opened by"] = openers
+    frame["Hour"] = dt.dt.hour.astype("int64")
+    frame["Week Day"] = dt.dt.weekday.astype("int64")
+    frame["Opened Month"] = dt.dt.month.astype("int64")
+    frame["Opened Year"] = dt.dt.year.astype("int64")
+    frame = frame[FEATURE_COLUMNS]
+
+    if categorical:
+        for column in CATEGORICAL_COLUMNS:
+            frame[column] = frame[column].astype("category")
+    return frame, kept
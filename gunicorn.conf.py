@@ -0,0 +1,20 @@
+import gc
+import os
+from dotenv import load_dotenv
+
+# gunicorn -c gunicorn.conf.py wsgi:app
+load_dotenv()
+
+bind = os.getenv("bind", "0.0.0.0:8080")
+workers = int(os.getenv("workers", "2"))
+timeout = int(os.getenv("worker_timeout", "60"))
+
+# Import wsgi (and therefore load the models) once in the master, then fork.
+# Workers share the model memory copy-on-write instead of each unpickling their own copy.
+preload_app = True
+
+
+def when_ready(server):
+    # Move the preloaded objects out of the GC's generations so collections in the
+    # workers do not touch (and copy) the shared pages.
+    gc.freeze()
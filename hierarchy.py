@@ -0,0 +1,119 @@
+"""
+Joint category -> subcategory decoding.
+
+Instead of taking the argmax of both models independently, the subcategory is chosen among the
+children of each of the top-k categories (taxonomy from the Subcategory workbook) and the pair
+with the highest P(category) * P(subcategory | category) wins, where P(subcategory | category) is
+the subcategory model's probability renormalised over that category's children. That joint score
+only picks the pair: the confidences reported are still each model's own probability, so the
+write-back threshold means the same as before.
+
+Decoding only runs when the workbook has a real parent column (see label_mapper.TaxonomyIndex);
+otherwise category and subcategory are picked independently. Categories without known children,
+and subcategories without a known parent, are not constrained.
+"""
+import os
+import threading
+
+import numpy as np
+from dotenv import load_dotenv
+
+from label_mapper import get_taxonomy
+
+load_dotenv()
+# Set to 0 to pick category and subcategory independently even when the taxonomy has parents
+HIERARCHICAL = os.getenv("hierarchical_subcategory", "1") != "0"
+# Categories considered per incident when searching for the best pair
+TOP_K = int(os.getenv("hierarchy_top_k", "3"))
+# Rows decoded at once; bounds the (rows x top_k x subcategories) working array
+CHUNK_ROWS = 10000
+
+_masks = {}
+_lock = threading.Lock()
+
+
+def enabled():
+    """Joint decoding is on (hierarchical_subcategory) and the taxonomy has real parent links."""
+    return HIERARCHICAL and get_taxonomy().has_parents
+
+
+def signature():
+    """Changes whenever decoding could give different results (settings or taxonomy file)."""
+    if not enabled():
+        return "independent"
+    return f"hierarchical:{TOP_K}:{get_taxonomy().version}"
+
+
+def child_mask(category_classes, subcategory_classes):
+    """Boolean (categories x subcategories) matrix of the allowed pairs, cached per taxonomy version."""
+    taxonomy = get_taxonomy()
+    key = (taxonomy.version, tuple(category_classes), tuple(subcategory_classes))
+    mask = _masks.get(key)
+    if mask is not None:
+        return mask
+
+    children = taxonomy.children()
+    parented = set().union(*children.values()) if children else set()
+    subcategories = [str(s).strip().lower() for s in subcategory_classes]
+    orphans = np.array([s not in parented for s in subcategories], dtype=bool)
+
+    mask = np.ones((len(category_classes), len(subcategories)), dtype=bool)
+    for i, category in enumerate(category_classes):
+        kids = children.get(str(category).strip().lower())
+        if not kids:
+            continue
+        allowed = orphans | np.array([s in kids for s in subcategories], dtype=bool)
+        if allowed.any():
+            mask[i] = allowed
+
+    with _lock:
+        _masks.clear()
+        _masks[key] = mask
+    return mask
+
+
+def best_pairs(category_proba, subcategory_proba, mask, top_k=TOP_K):
+    """
+    Indices and confidences of the jointly most probable (category, subcategory) per row.
+
+    Returns (category_idx, category_conf, subcategory_idx, subcategory_conf). The joint score only
+    chooses the pair; both confidences are the models' own probabilities for the chosen labels.
+    """
+    n = category_proba.shape[0]
+    k = max(1, min(top_k, category_proba.shape[1]))
+    out = [np.empty(n, dtype=int), np.empty(n), np.empty(n, dtype=int), np.empty(n)]
+
+    for start in range(0, n, CHUNK_ROWS):
+        cat = category_proba[start:start + CHUNK_ROWS]
+        sub = subcategory_proba[start:start + CHUNK_ROWS]
+        rows = np.arange(len(cat))
+
+        top = np.argsort(-cat, axis=1, kind="stable")[:, :k]
+        top_p = np.take_along_axis(cat, top, axis=1)
+
+        restricted = sub[:, None, :] * mask[top]
+        totals = restricted.sum(axis=2, keepdims=True)
+        # No probability mass on a category's children: score its subcategories unconstrained
+        conditional = np.where(totals > 0, restricted / np.where(totals > 0, totals, 1.0), sub[:, None, :])
+
+        best_sub = conditional.argmax(axis=2)
+        best_conf = np.take_along_axis(conditional, best_sub[..., None], axis=2)[..., 0]
+        choice = (top_p * best_conf).argmax(axis=1)
+
+        out[0][start:start + len(cat)] = top[rows, choice]
+        out[1][start:start + len(cat)] = top_p[rows, choice]
+        out[2][start:start + len(cat)] = best_sub[rows, choice]
+        out[3][start:start + len(cat)] = sub[rows, best_sub[rows, choice]]
+    return tuple(out)
+
+
+def predict_pairs(category_classes, category_proba, subcategory_classes, subcategory_proba, top_k=TOP_K):
+    """(category labels, confidences, subcategory labels, confidences) decoded jointly."""
+    mask = child_mask(category_classes, subcategory_classes)
+    cat_idx, cat_conf, sub_idx, sub_conf = best_pairs(category_proba, subcategory_proba, mask, top_k)
+    return (
+        category_classes[cat_idx].tolist(),
+        [round(float(c), 2) for c in cat_conf],
+        subcategory_classes[sub_idx].tolist(),
+        [round(float(c), 2) for c in sub_conf],
+    )
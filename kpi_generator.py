@@ -2,79 +2,76 @@ import json
 import csv
 from datetime import datetime
 import logging,os
+import numpy as np
 import pandas as pd
+from change_store import append_changes
+from log_config import Truncated, setup_logging
+from metrics import metrics
  
-# Set up logging
-logging.basicConfig(
-    level=logging.DEBUG,  # Set the lowest level of logging. It will capture all levels: DEBUG, INFO, WARNING, ERROR, CRITICAL
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(),  # Logs will be displayed on the console
-        logging.FileHandler('incident_comparison.log')  # Logs will be written to this file
-    ]
-)
+# Set up logging (asynchronous, own file, level from log_level in .env)
+logger = setup_logging('incident_comparison.log', 'kpi_generator')
  
  
+# Incident field -> (ML response key, output column)
+COMPARED_FIELDS = {
+    "priority": ("Priority", "Priority"),
+    "category": ("category", "Category"),
+    "subcategory": ("subcategory", "Subcategory"),
+    "assignment_group": ("assignment_Group", "Assignment_Group"),
+}
+
+
+def _field_value(value):
+    # Reference fields come back as {"link": ..., "value": ...}, plain fields as strings
+    if isinstance(value, dict):
+        return value.get("value")
+    return value
+
+
 # Function to compare the indicent changes
+@metrics.span("comparison")
 def compare_jsons(input_json, ml_model_response):
-    changes = []
     current_date = datetime.now().strftime("%d-%m-%Y")
-    logging.info(f"Started comparison process at {current_date}")
- 
-    # Loop through input data and corresponding ML model data
-    for incident in input_json['result']:
-        incident_id = incident['task_effective_number']
-        logging.debug(f"Comparing incident {incident_id}...")
-        ml_incident = next(item for item in ml_model_response if item['Incident_ID'] == incident_id)
- 
-        change_count = 0
- 
-        # Compare assignment group
-        if incident['assignment_group']['value'] != ml_incident['assignment_Group']['Prediction']:
-            change_count += 1
- 
-        # Compare category
-        if incident['category'] != ml_incident['category']['Prediction']:
-            change_count += 1
- 
-        # Compare subcategory
-        if incident['subcategory'] != ml_incident['subcategory']['Prediction']:
-            change_count += 1
- 
-        # Compare priority
-        if incident['priority'] != ml_incident['Priority']['Prediction']:
-            change_count += 1
- 
-        # Append results to changes list
-        changes.append({
-            'Date': current_date,  # Add date to the output
-            'Incident': incident_id,
-            'Priority': "Yes" if incident['priority'] != ml_incident['Priority']['Prediction'] else "No",
-            'Category':"Yes" if incident['category'] != ml_incident['category']['Prediction'] else "No",
-            'Subcategory': "Yes" if incident['subcategory'] != ml_incident['subcategory']['Prediction'] else "No",
-            'Assignment_Group': "Yes" if incident['assignment_group']['value'] != ml_incident['assignment_Group'][
-                'Prediction'] else "No",
-            'Global Change': change_count
-        })
-    logging.info(f"Comparison process completed. Found {len(changes)} incidents with changes.")
-    output_file = 'incident_changes.csv'
- 
-    # Check if the file exists
-    if os.path.exists(output_file):
-        # Load existing data
-        existing_df = pd.read_csv(output_file)
-        # Create a DataFrame from new changes
-        new_df = pd.DataFrame(changes)
-        # Append new data to existing data
-        updated_df = pd.concat([existing_df, new_df], ignore_index=True)
-    else:
-        # Create a new DataFrame if file doesn't exist
-        updated_df = pd.DataFrame(changes)
- 
-    # Save the updated DataFrame to Excel
-    updated_df.to_csv(output_file, index=False)
- 
-    print(f"The Excel file '{output_file}' has been updated or created successfully.")
+    logger.info("Started comparison process at %s", current_date)
+
+    incidents = input_json['result']
+
+    # Index the predictions once by Incident_ID instead of scanning the list per incident
+    predictions = {}
+    for item in ml_model_response:
+        predictions.setdefault(item.get('Incident_ID'), item)
+
+    incident_ids = [incident.get('task_effective_number') or incident.get('number') for incident in incidents]
+    missing = [incident_id for incident_id in incident_ids if incident_id not in predictions]
+    if missing:
+        logger.warning("No ML prediction for %d incidents (skipped by model_loader): %s", len(missing), Truncated(missing, max_items=20))
+
+    # Two aligned frames: current ServiceNow values and predicted values
+    matched = [(incident_id, incident) for incident_id, incident in zip(incident_ids, incidents) if incident_id in predictions]
+    columns = [column for _, column in COMPARED_FIELDS.values()]
+    current_df = pd.DataFrame(
+        [[_field_value(incident.get(field)) for field in COMPARED_FIELDS] for _, incident in matched],
+        columns=columns
+    )
+    predicted_df = pd.DataFrame(
+        [[(predictions[incident_id].get(key) or {}).get('Prediction') for key, _ in COMPARED_FIELDS.values()]
+         for incident_id, _ in matched],
+        columns=columns
+    )
+
+    # Single vectorized pass over every field
+    changed = current_df.ne(predicted_df)
+    changes_df = pd.DataFrame({'Date': current_date, 'Incident': [incident_id for incident_id, _ in matched]})
+    for column in ['Priority', 'Category', 'Subcategory', 'Assignment_Group']:
+        changes_df[column] = np.where(changed[column], "Yes", "No")
+    changes_df['Global Change'] = changed.sum(axis=1).astype(int)
+
+    logger.info("Comparison process completed. Found %d incidents with changes.", len(changes_df))
+    # Append-only daily partition: write cost stays constant however much history is kept
+    output_file = append_changes(changes_df)
+    if output_file:
+        print(f"Change log partition '{output_file}' has been updated or created successfully.")
+    return changes_df
  
 # Compare the JSONs
 # changes = compare_jsons(input_json, ml_model_response)
@@ -0,0 +1,177 @@
+import os
+import threading
+import pandas as pd
+
+# ------------------------
+# Label Mapping Workbooks
+# ------------------------
+CATEGORY_FILE = "Category.xlsx"
+SUBCATEGORY_FILE = "Subcategory.xlsx"
+SEARCH_COLUMN = "Text"
+TARGET_COLUMN = "Value"
+
+
+class LabelIndex:
+    """
+    Case-insensitive hash index over one label workbook.
+
+    The workbook is parsed once into a dict of lowercased search text -> target value.
+    It is only re-read when the file's mtime changes.
+    """
+
+    def __init__(self, excel_path, search_column=SEARCH_COLUMN, target_column=TARGET_COLUMN):
+        self.excel_path = excel_path
+        self.search_column = search_column
+        self.target_column = target_column
+        self._index = {}
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def _load(self, mtime):
+        df = pd.read_excel(self.excel_path, engine='openpyxl')
+        keys = df[self.search_column].astype(str).str.strip().str.lower()
+
+        index = {}
+        for key, value in zip(keys, df[self.target_column]):
+            # Keep the first matching row, like the original row scan did
+            index.setdefault(key, value)
+
+        self._index = index
+        self._mtime = mtime
+
+    def refresh(self):
+        mtime = os.path.getmtime(self.excel_path)
+        if mtime != self._mtime:
+            with self._lock:
+                if mtime != self._mtime:
+                    self._load(mtime)
+
+    def lookup(self, search_value, default=None):
+        self.refresh()
+        return self._index.get(str(search_value).strip().lower(), default)
+
+    def lookup_many(self, search_values, default=None):
+        """Lookups for a whole batch with a single mtime check."""
+        self.refresh()
+        index = self._index
+        return [index.get(str(value).strip().lower(), default) for value in search_values]
+
+    def __len__(self):
+        self.refresh()
+        return len(self._index)
+
+
+class TaxonomyIndex:
+    """
+    Category -> subcategory children, read from the Subcategory workbook (reloaded on mtime change).
+
+    Parents come only from a "Dependent value" column (as in a ServiceNow choice export), which holds
+    each subcategory's parent category value. Without that column the taxonomy is empty and
+    has_parents is False: row order in the workbook says nothing about parentage.
+    Keys and children are lowercased Text, like the model labels.
+    """
+
+    DEPENDENT_COLUMNS = ("Dependent value", "Dependent Value", "dependent_value")
+
+    def __init__(self, excel_path=SUBCATEGORY_FILE, category_path=CATEGORY_FILE):
+        self.excel_path = excel_path
+        self.category_path = category_path
+        self._children = {}
+        self._has_parents = False
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def _load(self, mtime):
+        df = pd.read_excel(self.excel_path, engine='openpyxl')
+        dependent = next((column for column in self.DEPENDENT_COLUMNS if column in df.columns), None)
+
+        children = {}
+        if dependent:
+            texts = df[SEARCH_COLUMN].astype(str).str.strip().str.lower()
+            elements = (df["Element"].astype(str).str.strip().str.lower() if "Element" in df.columns
+                        else pd.Series("subcategory", index=df.index))
+            # Dependent values are category Values; the models predict category Text
+            value_to_text = {}
+            if os.path.exists(self.category_path):
+                categories = pd.read_excel(self.category_path, engine='openpyxl')
+                for value, text in zip(categories[TARGET_COLUMN], categories[SEARCH_COLUMN]):
+                    value_to_text.setdefault(str(value).strip().lower(), str(text).strip().lower())
+            for element, text, parent in zip(elements, texts, df[dependent]):
+                if element != "subcategory" or pd.isna(parent) or not str(parent).strip():
+                    continue
+                parent = str(parent).strip().lower()
+                children.setdefault(value_to_text.get(parent, parent), set()).add(text)
+
+        self._children = children
+        self._has_parents = bool(children)
+        self._mtime = mtime
+
+    def refresh(self):
+        mtime = os.path.getmtime(self.excel_path)
+        if mtime != self._mtime:
+            with self._lock:
+                if mtime != self._mtime:
+                    self._load(mtime)
+
+    @property
+    def version(self):
+        self.refresh()
+        return self._mtime
+
+    @property
+    def has_parents(self):
+        """True when the workbook names a parent category for its subcategories."""
+        self.refresh()
+        return self._has_parents
+
+    def children(self):
+        """{category text: set of subcategory texts}, lowercased."""
+        self.refresh()
+        return self._children
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+_taxonomy = TaxonomyIndex()
+
+
+def get_index(excel_path, search_column=SEARCH_COLUMN, target_column=TARGET_COLUMN):
+    """Return the shared LabelIndex for a workbook, creating it on first use."""
+    key = (os.path.abspath(excel_path), search_column, target_column)
+    index = _indexes.get(key)
+    if index is None:
+        with _indexes_lock:
+            index = _indexes.setdefault(key, LabelIndex(excel_path, search_column, target_column))
+    return index
+
+
+def get_taxonomy():
+    """The shared category -> subcategory TaxonomyIndex."""
+    return _taxonomy
+
+
+def preload():
+    """Parse both label workbooks up front so the first prediction does not pay for it."""
+    for excel_path in (CATEGORY_FILE, SUBCATEGORY_FILE):
+        get_index(excel_path).refresh()
+    _taxonomy.refresh()
+
+
+def map_label(excel_path, search_column, target_column, search_value):
+    """
+    Map a model label to its ServiceNow value.
+    Returns the same "not found" message as the original workbook scan when there is no match.
+    """
+    result = get_index(excel_path, search_column, target_column).lookup(search_value)
+    if result is None:
+        return f"'{search_value}' not found in column '{search_column}'."
+    return result
+
+
+def map_labels(excel_path, search_column, target_column, search_values):
+    """map_label for a batch of labels; the workbook is checked for changes once, not per label."""
+    results = get_index(excel_path, search_column, target_column).lookup_many(search_values)
+    return [
+        f"'{value}' not found in column '{search_column}'." if result is None else result
+        for value, result in zip(search_values, results)
+    ]
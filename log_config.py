@@ -0,0 +1,106 @@
+import atexit
+import logging
+import os
+import queue
+import reprlib
+from logging.handlers import QueueHandler, QueueListener
+from dotenv import load_dotenv
+
+load_dotenv()
+# Level for console and log files, e.g. DEBUG, INFO, WARNING
+LOG_LEVEL = os.getenv("log_level", "INFO").upper()
+# Longest rendering of a payload that ends up in a log line
+LOG_MAX_CHARS = int(os.getenv("log_max_chars", "500"))
+# Items of a list payload that are rendered before the rest is summarised as a count
+LOG_MAX_ITEMS = int(os.getenv("log_max_items", "3"))
+
+FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+_listeners = {}
+
+
+def setup_logging(log_file=None, logger_name=None):
+    """
+    Configure a logger (the root logger by default) to log asynchronously.
+
+    Callers only enqueue records through a QueueHandler; a background QueueListener thread does the
+    console and file I/O. The level comes from log_level in .env. Calling it again for the same
+    logger returns the already configured logger.
+    """
+    logger = logging.getLogger(logger_name)
+    if logger_name in _listeners:
+        return logger
+
+    formatter = logging.Formatter(FORMAT)
+    handlers = [logging.StreamHandler()]  # Logs will be displayed on the console
+    if log_file:
+        handlers.append(logging.FileHandler(log_file))  # Logs will be written to this file
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    _listeners[logger_name] = (listener, log_file)
+
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    logger.addHandler(QueueHandler(log_queue))
+    logger.setLevel(LOG_LEVEL)
+    if logger_name:
+        # Named loggers have their own file; do not duplicate their records on the root handlers
+        logger.propagate = False
+    return logger
+
+
+@atexit.register
+def _stop_listeners():
+    # Flush whatever is still queued before the interpreter exits
+    for listener, _ in _listeners.values():
+        listener.stop()
+    _listeners.clear()
+
+
+def _restart_listeners_in_child():
+    # Listener threads do not survive fork (gunicorn preload, backfill workers):
+    # give the child its own queues and threads so its records are not silently dropped.
+    configured = {name: log_file for name, (_, log_file) in _listeners.items()}
+    _listeners.clear()
+    for name, log_file in configured.items():
+        setup_logging(log_file, name)
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_restart_listeners_in_child)
+
+
+class Truncated:
+    """
+    Lazy, size-bounded rendering of a payload for log messages.
+
+    Pass it as a %-style argument: nothing is rendered unless the record is actually emitted, and then
+    only the first LOG_MAX_ITEMS items of a list (or of a {"result": [...]} payload) are serialised.
+    """
+
+    def __init__(self, payload, max_items=LOG_MAX_ITEMS, max_chars=LOG_MAX_CHARS):
+        self.payload = payload
+        self.max_items = max_items
+        self.max_chars = max_chars
+
+    def __str__(self):
+        payload = self.payload
+        if isinstance(payload, dict) and isinstance(payload.get("result"), list):
+            payload = payload["result"]
+
+        if isinstance(payload, (list, tuple)):
+            head = ", ".join(reprlib.repr(item) for item in payload[:self.max_items])
+            more = len(payload) - self.max_items
+            text = f"[{head}{f', ... (+{more} more)' if more > 0 else ''}]"
+        else:
+            text = str(payload)
+
+        if len(text) > self.max_chars:
+            text = f"{text[:self.max_chars]}... ({len(text)} chars)"
+        return text
+
+    __repr__ = __str__
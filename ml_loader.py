@@ -1,28 +1,39 @@
 import json
-import joblib
+import numpy as np
 import pandas as pd
 from datetime import datetime,timedelta
-
-import logging
-
-# Set up logging
-logging.basicConfig(
-    level=logging.DEBUG,  # Set the lowest level of logging. It will capture all levels: DEBUG, INFO, WARNING, ERROR, CRITICAL
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(),  # Logs will be displayed on the console
-        logging.FileHandler('ml_model.log')  # Logs will be written to this file
-    ]
-)
+from label_mapper import map_label, map_labels
+from log_config import Truncated, setup_logging
+from metrics import metrics
+from model_registry import get_model, registry
+import hierarchy
+from fast_scorer import FAST_PATH_MAX_BATCH, UnknownCategory, get_fast_scorer
+from features import build_feature_frame, build_feature_row
+from multi_head import get_multi_head
+from prediction_cache import frame_keys, prediction_cache
+
+# Set up logging (asynchronous, level from log_level in .env)
+logger = setup_logging('ml_model.log')
 
 current_date = datetime.now().strftime("%d-%m-%Y")
 
 # ------------------------
 # Load Models
 # ------------------------
-assignment_group_model = joblib.load("assignment_group_model.pkl")
-category_model = joblib.load("category_model.pkl")
-subcategory_model = joblib.load("subcategory_model.pkl")
+# Models are loaded lazily through the shared registry on first use.
+# ml_loader.assignment_group_model etc. still work as module attributes.
+MODEL_NAMES = ["assignment_group", "category", "subcategory"]
+MODEL_ATTRIBUTES = {
+    "assignment_group_model": "assignment_group",
+    "category_model": "category",
+    "subcategory_model": "subcategory",
+}
+
+
+def __getattr__(name):
+    if name in MODEL_ATTRIBUTES:
+        return get_model(MODEL_ATTRIBUTES[name])
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 # ------------------------
@@ -46,23 +57,8 @@ def map_priority_with_confidence(impact: int = None, urgency: int = None):
 import pandas as pd
 
 def search_and_map(excel_path, search_column, target_column, search_value):
-    # Load the Excel file
-    df = pd.read_excel(excel_path, engine='openpyxl')
-
-    # Convert search column to lowercase for case-insensitive comparison
-    df['__search_lower__'] = df[search_column].astype(str).str.lower()
-    search_value_lower = search_value.lower()
-
-    # Find matching row
-    matched_row = df[df['__search_lower__'] == search_value_lower]
-
-
-    if not matched_row.empty:
-        # Get the corresponding value from the target column
-        result = matched_row.iloc[0][target_column]
-        return result
-    else:
-        return f"'{search_value}' not found in column '{search_column}'."
+    # Case-insensitive O(1) lookup against the cached workbook index (reloaded on mtime change)
+    return map_label(excel_path, search_column, target_column, search_value)
 
 # Example usage
 cat_excel_file = "Category.xlsx"  # Replace with your actual file path
@@ -79,63 +75,214 @@ def get_incidents(incident_list):
     incident = []
     #print(type(incident_list))
     count = len(incident_list["result"])
-    print("Number of incidents is ",count)
+    logger.info("Number of incidents is %d", count)
     for i in range(count):
         incident.append(incident_list["result"][i])
     return incident
 
-def model_loader(incident_list):
+def build_features(incident):
+    """
+    Build the common feature row for one incident.
+    Returns None when caller_id / opened_by are malformed so the incident can be skipped.
+    """
+    return build_feature_row(incident)
+
+
+def predict_priority(incident):
+    impact = int(incident.get("impact", 3)) if incident.get("impact") else None
+    urgency = int(incident.get("urgency", 3)) if incident.get("urgency") else None
+    return map_priority_with_confidence(impact, urgency)
+
+
+def predict_labels(model, df):
+    """
+    One predict_proba pass over the whole frame.
+    Labels come from the argmax over model.classes_ so predict() never has to run.
+    """
+    return labels_from_proba(model.classes_, model.predict_proba(df))
+
+
+def labels_from_proba(classes, proba):
+    """Argmax labels and their rounded confidences from a predict_proba matrix."""
+    best = proba.argmax(axis=1)
+    labels = classes[best].tolist()
+    confidences = [round(float(c), 2) for c in proba[np.arange(len(best)), best]]
+    return labels, confidences
+
+
+def decode_predictions(probas):
+    """
+    Per-incident predictions from the three predict_proba matrices.
+    Category and subcategory are decoded jointly when the taxonomy has parent links (see hierarchy.enabled).
+    """
+    ag = labels_from_proba(get_model("assignment_group").classes_, probas["assignment_group"])
+    category_classes = get_model("category").classes_
+    subcategory_classes = get_model("subcategory").classes_
+    with metrics.span("hierarchy"):
+        if hierarchy.enabled():
+            cat_labels, cat_confs, subcat_labels, subcat_confs = hierarchy.predict_pairs(
+                category_classes, probas["category"], subcategory_classes, probas["subcategory"])
+        else:
+            cat_labels, cat_confs = labels_from_proba(category_classes, probas["category"])
+            subcat_labels, subcat_confs = labels_from_proba(subcategory_classes, probas["subcategory"])
+
+    return [
+        {
+            "assignment_group": [ag[0][i], ag[1][i]],
+            "category": [cat_labels[i], cat_confs[i]],
+            "subcategory": [subcat_labels[i], subcat_confs[i]],
+        }
+        for i in range(len(cat_labels))
+    ]
+
+
+def build_result(incident, ag, cat, subcat):
+    priority, priority_conf = predict_priority(incident)
+    return {
+        "Incident_ID": incident.get("number", "unknown"),
+        "assignment_Group": {"Prediction": ag[0], "Confidence": ag[1]},
+        "category": {"Prediction": cat[0], "Confidence": cat[1]},
+        "subcategory": {"Prediction": subcat[0], "Confidence": subcat[1]},
+        "Priority": {"Prediction": priority, "Confidence": priority_conf}
+    }
+
+
+def model_loader(incident_list, batch=True):
+    """
+    Predict assignment group, category, subcategory and priority for a ServiceNow payload.
+
+    Args:
+        incident_list (dict): ServiceNow-style payload with a "result" list.
+        batch (bool): Build one feature frame for all incidents and run each model once.
+            Set to False to score incident by incident.
+    """
     api_data = get_incidents(incident_list)
-    logging.info(f"Ml loader started with incidents:{incident_list}")
+    logger.info("Ml loader started with %d incidents: %s", len(api_data), Truncated(api_data))
+
+    if not batch:
+        return _model_loader_per_incident(api_data)
+
+    if 0 < len(api_data) <= FAST_PATH_MAX_BATCH:
+        scorers = {name: get_fast_scorer(name) for name in MODEL_NAMES}
+        if all(scorers.values()):
+            return _model_loader_compiled(api_data, scorers)
+
+    # ------------------------
+    # Build one typed feature frame for the whole batch (columnar, single pass)
+    # ------------------------
+    with metrics.span("feature_build"):
+        df_all, kept = build_feature_frame(api_data)
+    incidents = [api_data[i] for i in kept]
+
+    if not incidents:
+        logger.info("⚠️ Results got are: []")
+        return []
+
+    # ------------------------
+    # Prediction cache: identical feature rows skip inference entirely
+    # ------------------------
+    if prediction_cache.enabled:
+        # Cached entries depend on the models and on how category / subcategory are decoded
+        prediction_cache.bind(f"{registry.fingerprint()}:{hierarchy.signature()}")
+    keys = frame_keys(df_all)
+    predictions = {}
+    pending = {}
+    for i, key in enumerate(keys):
+        if key in predictions or key in pending:
+            continue
+        cached = prediction_cache.get(key) if prediction_cache.enabled else None
+        if cached is not None:
+            predictions[key] = cached
+        else:
+            pending[key] = i
+
+    if pending:
+        if len(pending) == len(df_all):
+            df_batch = df_all
+        else:
+            df_batch = df_all.iloc[list(pending.values())].reset_index(drop=True)
+
+        # ------------------------
+        # One predict_proba pass per model; models with identical encoders share one encoding
+        # ------------------------
+        probas = get_multi_head(MODEL_NAMES).predict_proba(df_batch)
+        for key, prediction in zip(pending, decode_predictions(probas)):
+            predictions[key] = prediction
+            prediction_cache.put(key, predictions[key])
+        prediction_cache.save()
+
+    logger.info("Scored %d unique feature rows for %d incidents (%d served from cache)",
+                len(pending), len(incidents), len(predictions) - len(pending))
+
+    return _assemble_results(incidents, [predictions[key] for key in keys])
 
-    def safe_val(v, default="unknown"):
-        if v is None:
-            return default
-        if isinstance(v, str):
-            v = v.strip()
-            return v.lower() if v else default
-        return str(v).lower() if v else default
+
+def _assemble_results(incidents, predictions):
+    """Map raw labels to ServiceNow values and build one result per incident."""
+    # One span for the whole batch; per-row spans would skew the histogram and cost time per incident
+    with metrics.span("label_mapping"):
+        cat_preds = map_labels(cat_excel_file, search_column, target_column,
+                               [prediction["category"][0] for prediction in predictions])
+        subcat_preds = map_labels(subcat_excel_file, search_column, target_column,
+                                  [prediction["subcategory"][0] for prediction in predictions])
 
     results = []
+    for incident, prediction, cat_pred, subcat_pred in zip(incidents, predictions, cat_preds, subcat_preds):
+        ag_label, ag_conf = prediction["assignment_group"]
+        cat_conf = prediction["category"][1]
+        subcat_conf = prediction["subcategory"][1]
+        results.append(build_result(
+            incident,
+            (ag_label, ag_conf),
+            (cat_pred, cat_conf),
+            (subcat_pred, subcat_conf)
+        ))
+    metrics.inc("ticket_predictions_total", len(results))
+    logger.info("⚠️ Results got are: %s", Truncated(results))
+    return results
+
+
+def _model_loader_compiled(api_data, scorers):
+    """
+    Small batches: score feature dicts with the compiled scorers, no DataFrame and no pipeline overhead.
+    The prediction cache is skipped, a compiled pass costs about as much as the lookups.
+    """
+    incidents = []
+    rows = []
+    with metrics.span("feature_build"):
+        for incident in api_data:
+            features = build_feature_row(incident)
+            if features is None:
+                continue
+            incidents.append(incident)
+            rows.append(features)
+
+    if not rows:
+        logger.info("⚠️ Results got are: []")
+        return []
+
+    probas = {}
+    for name in MODEL_NAMES:
+        with metrics.span("inference", model=name, path="compiled"):
+            try:
+                probas[name] = scorers[name].predict_proba(rows)
+            except UnknownCategory:
+                # Same rows through the pipeline, which raises or handles the value as it always has
+                probas[name] = get_model(name).predict_proba(pd.DataFrame(rows))
+    predictions = decode_predictions(probas)
+    return _assemble_results(incidents, predictions)
+
+
+def _model_loader_per_incident(api_data):
+    assignment_group_model = get_model("assignment_group")
+    category_model = get_model("category")
+    subcategory_model = get_model("subcategory")
+    results = []
 
     for incident in api_data:
-        # Parse datetime
-        opened_at = incident.get("opened_at")
-        try:
-            dt = datetime.strptime(opened_at, "%Y-%m-%d %H:%M:%S") if opened_at else datetime.now()
-        except ValueError:
-            dt = datetime.now()
-
-            # Validate caller_id and opened_by
-        caller_id = incident.get("caller_id")
-        opened_by = incident.get("opened_by")
-
-        if not isinstance(caller_id, dict) or "value" not in caller_id:
-            logging.info(f"⚠️ Skipping incident due to malformed opened_by: {caller_id}")
-            print(f"⚠️ Skipping incident due to malformed caller_id: {caller_id}")
-            continue
-        if not isinstance(opened_by, dict) or "value" not in opened_by:
-            logging.info(f"⚠️ Skipping incident due to malformed opened_by: {opened_by}")
-            print(f"⚠️ Skipping incident due to malformed opened_by: {opened_by}")
+        features = build_features(incident)
+        if features is None:
             continue
-
-        # Build common feature row
-        features = {
-            "Subcategory": safe_val(incident.get("subcategory")),
-            "Category": safe_val(incident.get("category")),
-            "Priority": safe_val(incident.get("priority"), "p3 - medium"),
-            "Configuration item": safe_val(incident.get("cmdb_ci"), "generic"),
-            "Location": safe_val(incident.get("location")),
-            "Business unit": safe_val(incident.get("business_unit"), "wood - operations"),
-            "Legal Entity": safe_val(incident.get("company"), "wood group psn australia pty limited"),
-            "Reported By": safe_val(incident.get("caller_id", {}).get("value")),
-            "Opened by": safe_val(incident.get("opened_by", {}).get("value")),
-            "Hour": dt.hour,
-            "Week Day": dt.weekday(),
-            "Opened Month": dt.month,
-            "Opened Year": dt.year,
-            "Team Classfication": safe_val(incident.get("team_classification"), "gsd")
-        }
         df_ticket = pd.DataFrame([features])
 
         # ------------------------
@@ -155,26 +302,12 @@ def model_loader(incident_list):
         # 3) Subcategory
         # ------------------------
         subcat = subcategory_model.predict(df_ticket)[0]
-        subcat_pred=search_and_map(subcat_excel_file, search_column, target_column, subcat)
+        subcat_pred = search_and_map(subcat_excel_file, search_column, target_column, subcat)
         subcat_conf = round(float(subcategory_model.predict_proba(df_ticket).max()), 2)
 
         # ------------------------
-        # 4) Priority (rule-based)
+        # 4) Priority (rule-based) + Collect Results
         # ------------------------
-        impact = int(incident.get("impact", 3)) if incident.get("impact") else None
-        urgency = int(incident.get("urgency", 3)) if incident.get("urgency") else None
-        priority, priority_conf = map_priority_with_confidence(impact, urgency)
-
-        # ------------------------
-        # Collect Results
-        # ------------------------
-        results.append({
-            "Incident_ID": incident.get("number", "unknown"),
-            "assignment_Group": {"Prediction": ag_pred, "Confidence": ag_conf},
-            "category": {"Prediction": cat_pred, "Confidence": cat_conf},
-            "subcategory": {"Prediction": subcat_pred, "Confidence": subcat_conf},
-            "Priority": {"Prediction": priority, "Confidence": priority_conf}
-        })
-    logging.info(f"⚠️ Results got are: {results}")
+        results.append(build_result(incident, (ag_pred, ag_conf), (cat_pred, cat_conf), (subcat_pred, subcat_conf)))
+    logger.info("⚠️ Results got are: %s", Truncated(results))
     return results
-
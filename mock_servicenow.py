@@ -0,0 +1,263 @@
+"""
+Local stand-in for the ServiceNow Table API, for load testing fetch and write-back offline.
+
+    python mock_servicenow.py --scale 20000 --latency-ms 80 --jitter-ms 40 --rate-429 0.02
+
+then point .env at it:  url=http://127.0.0.1:8081/api/now/table/
+
+Incidents are seeded inside the poll window, so the first run.py fetches all of them. The watermark in
+state_file then moves past them: delete state_file and restart the mock before each load-test run.
+
+Implements GET/PUT/PATCH on incident, task_sla and sys_audit with sysparm_query filtering
+(=, !=, >, >=, <, <=, IN, NOTIN, ISEMPTY, ISNOTEMPTY, ^OR, ORDERBY/ORDERBYDESC; like ServiceNow, conditions
+it cannot parse are ignored), sysparm_limit / sysparm_offset pagination and sysparm_fields projection.
+"""
+import argparse
+import copy
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import flask
+
+SAMPLE_FILE = "Incident_API response.txt"
+# Seeded incidents are created within this many minutes before start-up (inside the 10-minute poll window)
+SEED_SPREAD_MINUTES = 9
+
+app = flask.Flask(__name__)
+
+TABLES = {"incident": [], "task_sla": [], "sys_audit": []}
+CONFIG = {"latency_ms": 0.0, "jitter_ms": 0.0, "rate_429": 0.0, "retry_after": 1}
+_lock = threading.Lock()
+_rng = random.Random(7)
+
+
+# ------------------------
+# Seeding
+# ------------------------
+def load_sample_incidents(path=SAMPLE_FILE):
+    with open(path, "r") as f:
+        text_data = f.read()
+    return json.loads(text_data[text_data.find("{"):])["result"]
+
+
+def seed(scale=None, seed_value=7, spread_minutes=SEED_SPREAD_MINUTES):
+    """
+    Fill the tables from the sample response, replicated up to `scale` incidents.
+    sys_created_on is spread over the last `spread_minutes`; the default keeps every incident inside
+    the 10-minute window of List_Incidents.default_query, so the first poll fetches all of them.
+    """
+    rng = random.Random(seed_value)
+    templates = load_sample_incidents()
+    scale = scale or len(templates)
+    start = datetime.utcnow() - timedelta(minutes=spread_minutes)
+    step = timedelta(minutes=spread_minutes) / max(1, scale)
+
+    incidents, slas, audits = [], [], []
+    for i in range(scale):
+        incident = copy.deepcopy(templates[i % len(templates)])
+        number = f"INC{i + 1:07d}"
+        created = (start + step * i).strftime("%Y-%m-%d %H:%M:%S")
+        incident.update({
+            "number": number,
+            "task_effective_number": number,
+            "sys_id": uuid.UUID(int=rng.getrandbits(128)).hex,
+            "sys_created_on": created,
+            "opened_at": created,
+            "state": rng.choice(["1", "2", "6", "7"]),
+        })
+        incidents.append(incident)
+
+        # Dot-walked fields are stored flat ("task.number") so they can be queried and projected directly
+        for _ in range(rng.randint(0, 2)):
+            slas.append({
+                "sys_id": uuid.UUID(int=rng.getrandbits(128)).hex,
+                "task.number": number,
+                "task": {"value": incident["sys_id"]},
+                "has_breached": "true" if rng.random() < 0.2 else "false",
+            })
+        for _ in range(rng.randint(0, 3)):
+            audits.append({
+                "sys_id": uuid.UUID(int=rng.getrandbits(128)).hex,
+                "documentkey": number,
+                "fieldname": "assignment_group",
+                "sys_created_on": created,
+            })
+
+    TABLES["incident"] = incidents
+    TABLES["task_sla"] = slas
+    TABLES["sys_audit"] = audits
+    print(f"Seeded {len(incidents)} incidents, {len(slas)} task_sla and {len(audits)} sys_audit records")
+
+
+# ------------------------
+# Encoded query support
+# ------------------------
+CONDITION = re.compile(r"^(?P<field>[\w.]+?)(?P<op>NOTIN|IN|ISNOTEMPTY|ISEMPTY|!=|>=|<=|=|>|<)(?P<value>.*)$")
+
+
+def _value(record, field):
+    value = record.get(field)
+    if isinstance(value, dict):
+        value = value.get("value")
+    return "" if value is None else str(value)
+
+
+def _match(record, condition):
+    field, op, expected = condition
+    actual = _value(record, field)
+    if op == "=":
+        return actual == expected
+    if op == "!=":
+        return actual != expected
+    if op == "IN":
+        return actual in expected.split(",")
+    if op == "NOTIN":
+        return actual not in expected.split(",")
+    if op == "ISEMPTY":
+        return actual == ""
+    if op == "ISNOTEMPTY":
+        return actual != ""
+    # Range operators: ServiceNow datetime strings and numeric strings both order correctly as text
+    # once they are the same width; compare numerically when both sides are numbers.
+    try:
+        actual_cmp, expected_cmp = float(actual), float(expected)
+    except ValueError:
+        actual_cmp, expected_cmp = actual, expected
+    return {
+        ">": actual_cmp > expected_cmp,
+        ">=": actual_cmp >= expected_cmp,
+        "<": actual_cmp < expected_cmp,
+        "<=": actual_cmp <= expected_cmp,
+    }[op]
+
+
+def parse_query(query):
+    """Encoded query -> (list of OR-groups of conditions, list of (field, descending))."""
+    groups, order_by = [], []
+    for part in filter(None, (query or "").split("^")):
+        if part.startswith("ORDERBYDESC"):
+            order_by.append((part[len("ORDERBYDESC"):], True))
+            continue
+        if part.startswith("ORDERBY"):
+            order_by.append((part[len("ORDERBY"):], False))
+            continue
+
+        is_or = part.startswith("OR") and groups
+        match = CONDITION.match(part[2:] if is_or else part)
+        if not match:
+            # ServiceNow ignores conditions it cannot parse instead of rejecting the request
+            app.logger.warning("Ignoring invalid query condition '%s'", part)
+            continue
+        condition = (match.group("field"), match.group("op"), match.group("value"))
+        if is_or:
+            groups[-1].append(condition)
+        else:
+            groups.append([condition])
+    return groups, order_by
+
+
+def run_query(records, query):
+    groups, order_by = parse_query(query)
+    matched = [r for r in records if all(any(_match(r, c) for c in group) for group in groups)]
+    for field, descending in reversed(order_by):
+        matched.sort(key=lambda r: _value(r, field), reverse=descending)
+    return matched
+
+
+def project(record, fields):
+    if not fields:
+        return record
+    return {field: record.get(field, "") for field in fields.split(",")}
+
+
+# ------------------------
+# Fault / latency injection
+# ------------------------
+@app.before_request
+def inject_latency_and_throttling():
+    delay = CONFIG["latency_ms"] + _rng.uniform(-CONFIG["jitter_ms"], CONFIG["jitter_ms"])
+    if delay > 0:
+        time.sleep(delay / 1000)
+    if CONFIG["rate_429"] and _rng.random() < CONFIG["rate_429"]:
+        response = flask.jsonify({"error": {"message": "Too many requests"}, "status": "failure"})
+        response.status_code = 429
+        response.headers["Retry-After"] = str(CONFIG["retry_after"])
+        return response
+    return None
+
+
+# ------------------------
+# Table API
+# ------------------------
+def _table(name):
+    if name not in TABLES:
+        flask.abort(404, description=f"Invalid table {name}")
+    return TABLES[name]
+
+
+@app.route("/api/now/table/<table>", methods=["GET"])
+def list_records(table):
+    records = _table(table)
+    args = flask.request.args
+    matched = run_query(records, args.get("sysparm_query"))
+
+    offset = int(args.get("sysparm_offset", 0))
+    limit = int(args.get("sysparm_limit", 10000))
+    page = [project(r, args.get("sysparm_fields")) for r in matched[offset:offset + limit]]
+
+    response = flask.jsonify({"result": page})
+    response.headers["X-Total-Count"] = str(len(matched))
+    return response
+
+
+@app.route("/api/now/table/<table>/<sys_id>", methods=["GET"])
+def get_record(table, sys_id):
+    for record in _table(table):
+        if record.get("sys_id") == sys_id:
+            return flask.jsonify({"result": project(record, flask.request.args.get("sysparm_fields"))})
+    return flask.jsonify({"error": {"message": "No Record found"}, "status": "failure"}), 404
+
+
+@app.route("/api/now/table/<table>/<sys_id>", methods=["PUT", "PATCH"])
+def update_record(table, sys_id):
+    changes = flask.request.get_json(silent=True) or {}
+    with _lock:
+        for record in _table(table):
+            if record.get("sys_id") == sys_id:
+                record.update(changes)
+                record["sys_updated_on"] = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+                return flask.jsonify({"result": record})
+    return flask.jsonify({"error": {"message": "No Record found"}, "status": "failure"}), 404
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local ServiceNow Table API mock.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--scale", type=int, help="Number of incidents to seed (default: as in the sample file)")
+    parser.add_argument("--spread-minutes", type=float, default=SEED_SPREAD_MINUTES,
+                        help="Spread sys_created_on over this many minutes before start-up "
+                             "(default keeps all incidents inside the poll window; 43200 for 30 days of history)")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Mean added latency per request")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Uniform +/- jitter around the latency")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with 429s")
+    args = parser.parse_args()
+
+    CONFIG.update({
+        "latency_ms": args.latency_ms,
+        "jitter_ms": args.jitter_ms,
+        "rate_429": args.rate_429,
+        "retry_after": args.retry_after,
+    })
+    seed(args.scale, spread_minutes=args.spread_minutes)
+    app.run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
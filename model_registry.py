@@ -0,0 +1,141 @@
+import hashlib
+import os
+import threading
+import time
+import logging
+import joblib
+from dotenv import load_dotenv
+
+# ------------------------
+# Model Files
+# ------------------------
+MODEL_FILES = {
+    "assignment_group": "assignment_group_model.pkl",
+    "category": "category_model.pkl",
+    "subcategory": "subcategory_model.pkl",
+}
+
+
+def _current_rss():
+    """Resident set size of this process in bytes (0 when it cannot be read)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        # ru_maxrss is a peak value (KiB on Linux), the best we can do without /proc
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    except (ImportError, OSError):
+        return 0
+
+
+class ModelRegistry:
+    """
+    Process-wide, lazily populated store of the fitted pipelines.
+
+    Each model is unpickled on first use only and the same instance is handed to every caller.
+    mmap_mode is passed straight to joblib.load so large numpy arrays can be memory-mapped
+    (only effective for uncompressed joblib dumps).
+    """
+
+    def __init__(self, model_files=None, mmap_mode=None):
+        self.model_files = dict(model_files or MODEL_FILES)
+        self.mmap_mode = mmap_mode
+        self._models = {}
+        self._stats = {}
+        self._hashes = {}
+        self._loaded_hashes = {}
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        model = self._models.get(name)
+        if model is not None:
+            return model
+
+        if name not in self.model_files:
+            raise KeyError(f"Unknown model '{name}'. Known models: {sorted(self.model_files)}")
+
+        with self._lock:
+            model = self._models.get(name)
+            if model is None:
+                model = self._load(name)
+        return model
+
+    def _load(self, name):
+        path = self.model_files[name]
+        rss_before = _current_rss()
+        start = time.perf_counter()
+
+        # Hash the file around the load so the recorded hash is the one of the bytes actually unpickled
+        while True:
+            file_hash = self.file_hash(name)
+            model = joblib.load(path, mmap_mode=self.mmap_mode)
+            if self.file_hash(name) == file_hash:
+                break
+            logging.info("Model file %s changed while loading, loading it again", path)
+
+        load_seconds = time.perf_counter() - start
+        self._models[name] = model
+        self._loaded_hashes[name] = file_hash
+        self._stats[name] = {
+            "path": path,
+            "file_bytes": os.path.getsize(path),
+            "load_seconds": round(load_seconds, 4),
+            "rss_bytes": max(0, _current_rss() - rss_before),
+            "mmap_mode": self.mmap_mode,
+        }
+        logging.info("Loaded model '%s' from %s in %.3fs (+%.1f MiB resident)",
+                     name, path, load_seconds, self._stats[name]["rss_bytes"] / 1024 / 1024)
+        return model
+
+    def preload(self, names=None):
+        """Load the given models (all by default) now, e.g. before forking workers."""
+        for name in names or self.model_files:
+            self.get(name)
+        return self
+
+    def file_hash(self, name):
+        """sha256 of the model file, recomputed only when its size or mtime changes."""
+        path = self.model_files[name]
+        stat = os.stat(path)
+        signature = (stat.st_size, stat.st_mtime)
+        cached = self._hashes.get(name)
+        if cached and cached[0] == signature:
+            return cached[1]
+
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        self._hashes[name] = (signature, digest.hexdigest())
+        return self._hashes[name][1]
+
+    def fingerprint(self):
+        """
+        Combined hash of the models this process has in memory (loading any that are not yet loaded).
+        Built from each file's sha256 as it was when loaded, so a retrain on disk does not change it
+        until the process actually serves the new models.
+        """
+        combined = hashlib.sha256()
+        for name in sorted(self.model_files):
+            self.get(name)
+            combined.update(f"{name}:{self._loaded_hashes[name]};".encode("utf-8"))
+        return combined.hexdigest()
+
+    def is_loaded(self, name):
+        return name in self._models
+
+    def stats(self):
+        """Load time and resident size per loaded model."""
+        return {name: dict(stat) for name, stat in self._stats.items()}
+
+
+load_dotenv()
+registry = ModelRegistry(mmap_mode=os.getenv("model_mmap_mode") or None)
+
+
+def get_model(name):
+    """Shortcut for registry.get(name)."""
+    return registry.get(name)
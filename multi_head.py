@@ -0,0 +1,154 @@
+"""
+Shared-encoder inference for the three classifiers.
+
+All models are fed the same feature frame. When their preprocessing steps (everything but the final
+estimator) are identical, the frame is encoded once and the matrix goes to each model's estimator.
+Models whose preprocessing differs keep running their own full pipeline.
+
+Retrain with fit_shared_heads() / save_shared_heads() so the three .pkl files share one fitted encoder.
+"""
+import logging
+import os
+import threading
+
+import joblib
+from dotenv import load_dotenv
+from sklearn.base import clone
+from sklearn.pipeline import Pipeline
+
+from metrics import metrics
+from model_registry import MODEL_FILES, registry
+
+load_dotenv()
+# Set to 0 to always run the three pipelines independently
+SHARED_ENCODER = os.getenv("shared_encoder", "1") != "0"
+
+
+def encoder_hash(pipeline):
+    """Content hash of a fitted pipeline's preprocessing (all steps but the last)."""
+    if not isinstance(pipeline, Pipeline) or len(pipeline.steps) < 2:
+        return None
+    return joblib.hash(pipeline[:-1])
+
+
+class MultiHeadScorer:
+    """
+    Groups models by encoder hash. Each group encodes the frame once and runs every head on it;
+    a group of one is just the model's own pipeline.
+    """
+
+    def __init__(self, models):
+        self.models = dict(models)
+        groups = {}
+        for name, pipeline in self.models.items():
+            key = encoder_hash(pipeline) if SHARED_ENCODER else None
+            groups.setdefault(key or f"independent:{name}", []).append(name)
+        self.groups = list(groups.values())
+
+        shared = [names for names in self.groups if len(names) > 1]
+        if shared:
+            logging.info("Shared encoder for models %s", shared)
+        else:
+            logging.info("No shared encoders, models run as independent pipelines")
+
+    def predict_proba(self, df):
+        """{model name: predict_proba(df)} with each distinct encoder applied once."""
+        probas = {}
+        for names in self.groups:
+            if len(names) == 1:
+                name = names[0]
+                with metrics.span("inference", model=name):
+                    probas[name] = self.models[name].predict_proba(df)
+                continue
+
+            with metrics.span("encode", models="+".join(names)):
+                encoded = self.models[names[0]][:-1].transform(df)
+            for name in names:
+                with metrics.span("inference", model=name):
+                    probas[name] = self.models[name][-1].predict_proba(encoded)
+        return probas
+
+
+_scorer = None
+_lock = threading.Lock()
+
+
+def get_multi_head(names):
+    """MultiHeadScorer over the registry models, rebuilt only when a model object changes."""
+    global _scorer
+    models = {name: registry.get(name) for name in names}
+    scorer = _scorer
+    # Estimators compare by identity, so this only matches the very same loaded objects
+    if scorer is not None and scorer.models == models:
+        return scorer
+    with _lock:
+        if _scorer is None or _scorer.models != models:
+            _scorer = MultiHeadScorer(models)
+        return _scorer
+
+
+# ------------------------
+# Retraining helpers
+# ------------------------
+# Encoders that learn from y (sklearn and category_encoders); one fit cannot serve three targets
+TARGET_ENCODERS = {
+    "TargetEncoder", "LeaveOneOutEncoder", "MEstimateEncoder", "CatBoostEncoder", "JamesSteinEncoder",
+    "WOEEncoder", "GLMMEncoder", "QuantileEncoder", "SummaryEncoder",
+}
+
+
+def _target_dependent_steps(step):
+    """Class names of target-dependent encoders anywhere inside a (nested) transformer."""
+    found = []
+    if type(step).__name__ in TARGET_ENCODERS:
+        found.append(type(step).__name__)
+    for _, child in getattr(step, "steps", []):
+        found.extend(_target_dependent_steps(child))
+    for _, child, _ in getattr(step, "transformers", []):
+        found.extend(_target_dependent_steps(child))
+    return found
+
+
+def fit_shared_heads(preprocessor, estimators, X, targets):
+    """
+    Fit one preprocessor and one estimator per target on its output.
+
+    The preprocessor is fitted once, without y, so it must be unsupervised (one-hot / ordinal
+    encoding, scaling, ...). Target-dependent encoders such as TargetEncoder would be fitted for
+    one target and leak it into the others; they are refused with a ValueError, train those
+    models as independent pipelines instead.
+
+    Args:
+        preprocessor: unfitted transformer (e.g. the ColumnTransformer) shared by every model.
+        estimators (dict): model name -> unfitted final estimator.
+        X (DataFrame): training features in features.FEATURE_COLUMNS layout.
+        targets (dict): model name -> labels for X.
+
+    Returns:
+        dict of model name -> fitted Pipeline, all holding the same fitted preprocessor.
+    """
+    supervised = _target_dependent_steps(preprocessor)
+    if supervised:
+        raise ValueError(f"A shared preprocessor cannot contain target-dependent encoders: {supervised}")
+    try:
+        encoder = clone(preprocessor).fit(X)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Shared preprocessor could not be fitted without y; is it target-dependent? {e}") from e
+    encoded = encoder.transform(X)
+    pipelines = {}
+    for name, estimator in estimators.items():
+        head = clone(estimator).fit(encoded, targets[name])
+        pipelines[name] = Pipeline([("preprocessor", encoder), ("classifier", head)])
+    return pipelines
+
+
+def save_shared_heads(pipelines, model_files=None):
+    """Dump the fitted pipelines to the registry's model files and check they still share an encoder."""
+    model_files = model_files or MODEL_FILES
+    hashes = {name: encoder_hash(pipeline) for name, pipeline in pipelines.items()}
+    if len(set(hashes.values())) > 1:
+        raise ValueError(f"Pipelines do not share one encoder: {hashes}")
+    for name, pipeline in pipelines.items():
+        joblib.dump(pipeline, model_files[name])
+        logging.info("Saved '%s' to %s", name, model_files[name])
+    return hashes
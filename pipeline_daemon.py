@@ -0,0 +1,144 @@
+import logging
+import os
+import queue
+import signal
+import threading
+import time
+from dotenv import load_dotenv
+
+import label_mapper
+from List_Incidents import default_query, iter_incident_pages
+from Update_Incident import send_updates
+from kpi_generator import compare_jsons
+from metrics import metrics
+from ml_loader import model_loader
+from model_registry import registry
+from watermark import Watermark
+
+# Marks the end of one cycle's stream of pages
+_END_OF_CYCLE = object()
+
+
+class PipelineDaemon:
+    """
+    Resident replacement for the one-shot run.py.
+
+    Models stay loaded between cycles. Within a cycle the stages run in their own threads,
+    joined by bounded queues, so fetching page N+1 overlaps with inference on page N and
+    write-back / comparison of page N-1.
+    """
+
+    def __init__(self, interval=None, queue_size=None, page_size=None):
+        load_dotenv()
+        self.interval = float(interval or os.getenv("poll_interval_seconds", "600"))
+        self.queue_size = int(queue_size or os.getenv("pipeline_queue_size", "2"))
+        self.page_size = page_size
+        self.watermark = Watermark()
+        self.stop_event = threading.Event()
+
+    # ------------------------
+    # Lifecycle
+    # ------------------------
+    def install_signal_handlers(self):
+        signal.signal(signal.SIGTERM, self._handle_signal)
+        signal.signal(signal.SIGINT, self._handle_signal)
+
+    def _handle_signal(self, signum, frame):
+        logging.info("Received signal %s, finishing in-flight pages before shutdown", signum)
+        self.stop_event.set()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def run(self):
+        self.install_signal_handlers()
+
+        # Keep the models warm for the whole lifetime of the process
+        registry.preload()
+        label_mapper.preload()
+        logging.info("Pipeline daemon started, polling every %ss", self.interval)
+
+        while not self.stop_event.is_set():
+            started = time.perf_counter()
+            try:
+                processed = self.run_cycle()
+                logging.info("Cycle finished: %d incidents in %.2fs", processed, time.perf_counter() - started)
+            except Exception:
+                logging.exception("Pipeline cycle failed")
+            metrics.write_textfile()
+
+            # Sleep until the next tick, waking immediately on SIGTERM
+            self.stop_event.wait(max(0.0, self.interval - (time.perf_counter() - started)))
+
+        logging.info("Pipeline daemon stopped")
+
+    # ------------------------
+    # One cycle
+    # ------------------------
+    def run_cycle(self):
+        to_infer = queue.Queue(maxsize=self.queue_size)
+        to_write = queue.Queue(maxsize=self.queue_size)
+        errors = []
+        processed = [0]
+        # Set on the first failed page: later pages are left for the next cycle so the
+        # watermark never moves past incidents that were not written back
+        failed = threading.Event()
+
+        def fetch():
+            try:
+                query = self.watermark.query(default_query)
+                for page in iter_incident_pages(query, self.page_size):
+                    page = self.watermark.filter_new(page)
+                    if page:
+                        to_infer.put(page)
+                    if self.stop_event.is_set() or failed.is_set():
+                        break
+            except Exception as e:
+                errors.append(e)
+            finally:
+                to_infer.put(_END_OF_CYCLE)
+
+        def infer():
+            while True:
+                page = to_infer.get()
+                if page is _END_OF_CYCLE:
+                    to_write.put(_END_OF_CYCLE)
+                    return
+                if failed.is_set():
+                    continue
+                try:
+                    payload = {"result": page}
+                    to_write.put((payload, model_loader(payload)))
+                except Exception as e:
+                    errors.append(e)
+                    failed.set()
+
+        def write():
+            while True:
+                item = to_write.get()
+                if item is _END_OF_CYCLE:
+                    return
+                payload, ml_response = item
+                if failed.is_set():
+                    logging.warning("Skipping %d incidents after a failed page; they will be picked up again next cycle",
+                                    len(payload["result"]))
+                    continue
+                try:
+                    send_updates(ml_response, payload)
+                    compare_jsons(payload, ml_response)
+                    # Pages arrive in order, so the mark only ever moves forward
+                    self.watermark.advance(payload["result"]).save()
+                    processed[0] += len(payload["result"])
+                except Exception as e:
+                    errors.append(e)
+                    failed.set()
+
+        stages = [threading.Thread(target=stage, name=f"pipeline-{stage.__name__}") for stage in (fetch, infer, write)]
+        for stage in stages:
+            stage.start()
+        for stage in stages:
+            stage.join()
+
+        if errors:
+            raise errors[0]
+        return processed[0]
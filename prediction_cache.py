@@ -0,0 +1,124 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+from dotenv import load_dotenv
+
+
+def feature_key(features):
+    """Stable fingerprint of a normalized feature dict."""
+    encoded = json.dumps(features, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha1(encoded.encode("utf-8")).hexdigest()
+
+
+def frame_keys(frame):
+    """
+    Fingerprint of every row of a feature frame, hashed column-wise in one vectorized pass.
+    Categorical columns hash by value, so keys do not depend on a batch's category set.
+    """
+    hashes = pd.util.hash_pandas_object(frame[sorted(frame.columns)], index=False)
+    return [f"{h:016x}" for h in hashes.tolist()]
+
+
+class PredictionCache:
+    """
+    Bounded LRU of feature fingerprint -> raw predictions of all three models.
+
+    Entries are {"assignment_group": [label, confidence], "category": [...], "subcategory": [...]}.
+    The cache is tied to a models fingerprint (hash of the loaded models); when that changes
+    every entry is dropped. With a path set, entries are persisted as JSON between runs.
+    """
+
+    def __init__(self, maxsize=50000, path=None):
+        self.maxsize = maxsize
+        self.path = path
+        self.models_fingerprint = None
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        if path:
+            self.load()
+
+    @property
+    def enabled(self):
+        return self.maxsize > 0
+
+    def bind(self, models_fingerprint):
+        """Invalidate everything if the models changed since the entries were cached."""
+        with self._lock:
+            if models_fingerprint != self.models_fingerprint:
+                if self._data:
+                    logging.info("Models changed, clearing prediction cache")
+                self._data.clear()
+                self.models_fingerprint = models_fingerprint
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, entry):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._data[key] = entry
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    # ------------------------
+    # Persistence
+    # ------------------------
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return self
+        try:
+            with open(self.path, "r") as f:
+                state = json.load(f)
+        except (OSError, ValueError) as e:
+            logging.warning("Ignoring unreadable prediction cache %s: %s", self.path, e)
+            return self
+        with self._lock:
+            self.models_fingerprint = state.get("models_fingerprint")
+            self._data = OrderedDict(state.get("entries", []))
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return self
+
+    def save(self):
+        if not self.path:
+            return self
+        with self._lock:
+            state = {
+                "models_fingerprint": self.models_fingerprint,
+                "entries": list(self._data.items()),
+            }
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.path)
+        return self
+
+
+load_dotenv()
+prediction_cache = PredictionCache(
+    maxsize=int(os.getenv("prediction_cache_size", "50000")),
+    path=os.getenv("prediction_cache_file") or None
+)
@@ -1,4 +1,69 @@
 import flask
+import logging
+
+import fast_scorer
+import label_mapper
+from metrics import metrics
+from ml_loader import model_loader
+from model_registry import registry
+
+# ------------------------
+# Warm up once per process
+# ------------------------
+# With gunicorn's preload_app (see gunicorn.conf.py) this runs in the master before
+# workers are forked, so every worker shares the unpickled models copy-on-write.
+registry.preload()
+label_mapper.preload()
+fast_scorer.preload()
 
 # The flask app for serving predictions
 app = flask.Flask(__name__)
+
+
+def _error(message, status):
+    return flask.jsonify({"error": message}), status
+
+
+@app.route("/ping", methods=["GET"])
+def ping():
+    """Health check: healthy once all models are loaded."""
+    healthy = all(registry.is_loaded(name) for name in registry.model_files)
+    status = 200 if healthy else 503
+    return flask.jsonify({"status": "ok" if healthy else "loading", "models": registry.stats()}), status
+
+
+@app.route("/predict", methods=["POST"])
+def predict():
+    """
+    Predict a single incident.
+    Body: one ServiceNow incident record (the same shape as an element of "result").
+    """
+    incident = flask.request.get_json(silent=True)
+    if not isinstance(incident, dict):
+        return _error("Request body must be a JSON incident object.", 400)
+
+    results = model_loader({"result": [incident]})
+    if not results:
+        return _error("Incident skipped: caller_id / opened_by missing or malformed.", 422)
+    return flask.jsonify(results[0])
+
+
+@app.route("/predict/batch", methods=["POST"])
+def predict_batch():
+    """
+    Predict a ServiceNow-style payload.
+    Body: {"result": [incident, ...]}. Skipped incidents are simply absent from the response.
+    """
+    payload = flask.request.get_json(silent=True)
+    if not isinstance(payload, dict) or not isinstance(payload.get("result"), list):
+        return _error("Request body must be a JSON object with a 'result' list.", 400)
+
+    results = model_loader(payload)
+    logging.info("Batch prediction: %d of %d incidents scored", len(results), len(payload["result"]))
+    return flask.jsonify({"result": results})
+
+
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    """Stage timings and counters of this worker in Prometheus text format."""
+    return flask.Response(metrics.render(), mimetype="text/plain; version=0.0.4")
@@ -1,20 +1,10 @@
 import joblib
-import pandas as pd
 import json
-from datetime import datetime
+from features import PRIORITY_MAP, build_feature_frame
 
 # Load model
 model = joblib.load("assignment_group_classifier_model_P3_12.pkl")
 
-# Priority mapping
-PRIORITY_MAP = {
-    "1": "p1 - critical",
-    "2": "p2 - high",
-    "3": "p3 - medium",
-    "4": "p4 - low",
-    "5": "p5 - planning"
-}
-
 # Read API response from .txt
 with open("Incident_API response.txt", "r") as f:
     text_data = f.read()
@@ -26,53 +16,22 @@ try:
 except json.JSONDecodeError as e:
     raise ValueError("❌ Failed to parse Incident_API response.txt") from e
 
-results = []
-
-# Helper: normalize safely
-def safe_val(v, default="unknown"):
-    if v is None:
-        return default
-    if isinstance(v, str):
-        v = v.strip()
-        return v.lower() if v else default
-    return str(v).lower() if v else default
-
-for incident in api_data.get("result", []):
-    # Parse opened_at
-    opened_at = incident.get("opened_at")
-    try:
-        dt = datetime.strptime(opened_at, "%Y-%m-%d %H:%M:%S") if opened_at else datetime.now()
-    except ValueError:
-        dt = datetime.now()
+# Build the model-ready dataframe for all incidents at once (null-safe, shared with ml_loader)
+incidents = api_data.get("result", [])
+# This model was trained on mapped priorities ("1" -> "p1 - critical", ...)
+new_tickets, kept = build_feature_frame(incidents, priority_map=PRIORITY_MAP)
 
-    # Build model-ready dataframe (null-safe)
-    new_ticket = pd.DataFrame([{
-        "Subcategory": safe_val(incident.get("subcategory")),
-        "Category": safe_val(incident.get("category")),
-        "Priority": PRIORITY_MAP.get(str(incident.get("priority")), "p3 - medium"),
-        "Configuration item": safe_val(incident.get("cmdb_ci"), "generic"),
-        "Location": safe_val(incident.get("location")),
-        "Business unit": safe_val(incident.get("business_unit"), "wood - operations"),
-        "Legal Entity": safe_val(incident.get("company"), "wood group psn australia pty limited"),
-        "Reported By": safe_val(incident.get("caller_id", {}).get("value")),
-        "Opened by": safe_val(incident.get("opened_by", {}).get("value")),
-        "Hour": dt.hour,
-        "Week Day": dt.weekday(),
-        "Opened Month": dt.month,
-        "Opened Year": dt.year,
-        "Team Classfication": safe_val(incident.get("team_classification"), "gsd")
-    }])
-
-    # Predict
-    predicted_group = model.predict(new_ticket)[0]
-    predicted_proba = model.predict_proba(new_ticket)[0]
-    confidence_score = round(float(predicted_proba.max()), 2)
-
-    results.append({
-        "Incident_ID": incident.get("number", "unknown"),
-        "Assignment_Group": predicted_group,
-        "Confidence_Score": confidence_score
-    })
+# Predict
+results = []
+if len(new_tickets):
+    predicted_proba = model.predict_proba(new_tickets)
+    predicted_groups = model.classes_[predicted_proba.argmax(axis=1)]
+    for i, position in enumerate(kept):
+        results.append({
+            "Incident_ID": incidents[position].get("number", "unknown"),
+            "Assignment_Group": predicted_groups[i],
+            "Confidence_Score": round(float(predicted_proba[i].max()), 2)
+        })
 
 # Save results to JSON file
 output_file = "incidents_predictions.json"
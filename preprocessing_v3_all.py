@@ -1,14 +1,14 @@
-import joblib
-import pandas as pd
+from features import build_feature_frame
+from model_registry import get_model
+import numpy as np
 import json
-from datetime import datetime
 
 # ------------------------
 # Load Models
 # ------------------------
-assignment_group_model = joblib.load("assignment_group_model.pkl")
-category_model = joblib.load("category_model.pkl")
-subcategory_model = joblib.load("subcategory_model.pkl")
+assignment_group_model = get_model("assignment_group")
+category_model = get_model("category")
+subcategory_model = get_model("subcategory")
 
 # ------------------------
 # Priority Mapping Function
@@ -39,67 +39,23 @@ try:
 except json.JSONDecodeError as e:
     raise ValueError("❌ Failed to parse Incident_API response.txt") from e
 
-results = []
-
 # ------------------------
-# Helper: normalize safely
+# Build features for all incidents at once
 # ------------------------
-def safe_val(v, default="unknown"):
-    if v is None:
-        return default
-    if isinstance(v, str):
-        v = v.strip()
-        return v.lower() if v else default
-    return str(v).lower() if v else default
+incidents = api_data.get("result", [])
+df_all, kept = build_feature_frame(incidents)
+incidents = [incidents[i] for i in kept]
 
 # ------------------------
-# Loop over incidents
+# 1) Assignment Group  2) Category  3) Subcategory
 # ------------------------
-for incident in api_data.get("result", []):
-    # Parse datetime
-    opened_at = incident.get("opened_at")
-    try:
-        dt = datetime.strptime(opened_at, "%Y-%m-%d %H:%M:%S") if opened_at else datetime.now()
-    except ValueError:
-        dt = datetime.now()
-
-    # Build common feature row
-    features = {
-        "Subcategory": safe_val(incident.get("subcategory")),
-        "Category": safe_val(incident.get("category")),
-        "Priority": safe_val(incident.get("priority"), "p3 - medium"),
-        "Configuration item": safe_val(incident.get("cmdb_ci"), "generic"),
-        "Location": safe_val(incident.get("location")),
-        "Business unit": safe_val(incident.get("business_unit"), "wood - operations"),
-        "Legal Entity": safe_val(incident.get("company"), "wood group psn australia pty limited"),
-        "Reported By": safe_val(incident.get("caller_id", {}).get("value")),
-        "Opened by": safe_val(incident.get("opened_by", {}).get("value")),
-        "Hour": dt.hour,
-        "Week Day": dt.weekday(),
-        "Opened Month": dt.month,
-        "Opened Year": dt.year,
-        "Team Classfication": safe_val(incident.get("team_classification"), "gsd")
-    }
-    df_ticket = pd.DataFrame([features])
-
-    # ------------------------
-    # 1) Assignment Group
-    # ------------------------
-    ag_pred = assignment_group_model.predict(df_ticket)[0]
-    ag_conf = round(float(assignment_group_model.predict_proba(df_ticket).max()), 2)
-
-    # ------------------------
-    # 2) Category
-    # ------------------------
-    cat_pred = category_model.predict(df_ticket)[0]
-    cat_conf = round(float(category_model.predict_proba(df_ticket).max()), 2)
-
-    # ------------------------
-    # 3) Subcategory
-    # ------------------------
-    subcat_pred = subcategory_model.predict(df_ticket)[0]
-    subcat_conf = round(float(subcategory_model.predict_proba(df_ticket).max()), 2)
+predictions = {}
+for name, model in [("ag", assignment_group_model), ("cat", category_model), ("subcat", subcategory_model)]:
+    proba = model.predict_proba(df_all) if len(df_all) else np.empty((0, len(model.classes_)))
+    predictions[name] = (model.classes_[proba.argmax(axis=1)], proba.max(axis=1))
 
+results = []
+for i, incident in enumerate(incidents):
     # ------------------------
     # 4) Priority (rule-based)
     # ------------------------
@@ -110,6 +66,9 @@ for incident in api_data.get("result", []):
     # ------------------------
     # Collect Results
     # ------------------------
+    ag_pred, ag_conf = predictions["ag"][0][i], round(float(predictions["ag"][1][i]), 2)
+    cat_pred, cat_conf = predictions["cat"][0][i], round(float(predictions["cat"][1][i]), 2)
+    subcat_pred, subcat_conf = predictions["subcat"][0][i], round(float(predictions["subcat"][1][i]), 2)
     results.append({
         "Incident_ID": incident.get("number", "unknown"),
         "Assignment_Group": {"Prediction": ag_pred, "Confidence": ag_conf},
@@ -1,6 +1,7 @@
 import json
 import pandas as pd
 from datetime import datetime
+from report_sink import write_report
 
 def gen_report(predictions):
 
@@ -57,6 +58,6 @@ def gen_report(predictions):
     # ------------------------
     # Save to Excel
     # ------------------------
-    report.to_excel(OUTPUT_FILE, index=False)
+    output_file = write_report(report, OUTPUT_FILE)
 
-    print(f"✅ Analysis report saved as {OUTPUT_FILE}")
+    print(f"✅ Analysis report saved as {output_file}")
@@ -0,0 +1,104 @@
+import os
+from dotenv import load_dotenv
+from openpyxl import Workbook
+
+load_dotenv()
+# xlsx (default, what Excel users open), parquet, arrow (Arrow IPC / Feather v2) or csv
+REPORT_FORMAT = os.getenv("report_format", "xlsx").lower()
+XLSX_CHUNK_ROWS = int(os.getenv("xlsx_chunk_rows", "10000"))
+
+EXTENSIONS = {
+    "xlsx": ".xlsx",
+    "parquet": ".parquet",
+    "arrow": ".arrow",
+    "csv": ".csv",
+}
+
+
+def output_path(path, fmt=None):
+    """Swap the extension of path for the one matching fmt."""
+    fmt = (fmt or REPORT_FORMAT).lower()
+    if fmt not in EXTENSIONS:
+        raise ValueError(f"Unsupported report format '{fmt}'. Use one of {sorted(EXTENSIONS)}.")
+    return os.path.splitext(path)[0] + EXTENSIONS[fmt]
+
+
+def _require_pyarrow(fmt):
+    try:
+        import pyarrow
+        return pyarrow
+    except ImportError as e:
+        raise ImportError(f"Writing '{fmt}' reports needs pyarrow (pip install pyarrow).") from e
+
+
+def _cell_value(value):
+    """ServiceNow reference fields ({"link", "value"}) become their value; other containers a string."""
+    if isinstance(value, dict):
+        return value["value"] if "value" in value else str(value)
+    if isinstance(value, (list, tuple, set)):
+        return str(value)
+    return value
+
+
+def flatten_cells(df):
+    """
+    Copy of df whose object columns hold only scalars, which openpyxl and pyarrow can write.
+    Columns without any dict / list cells are left untouched.
+    """
+    flat = None
+    for column in df.columns[df.dtypes == object]:
+        values = df[column]
+        if not values.map(lambda v: isinstance(v, (dict, list, tuple, set))).any():
+            continue
+        if flat is None:
+            flat = df.copy()
+        flat[column] = values.map(_cell_value)
+    return df if flat is None else flat
+
+
+def write_xlsx_streaming(chunks, path, chunk_rows=XLSX_CHUNK_ROWS):
+    """
+    Write one or more DataFrames to a single sheet with openpyxl's write-only mode.
+    Rows are streamed to disk instead of building the whole workbook in memory.
+    """
+    if hasattr(chunks, "columns"):
+        chunks = [chunks]
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    header_written = False
+    for df in chunks:
+        if not header_written:
+            sheet.append([str(column) for column in df.columns])
+            header_written = True
+        for start in range(0, len(df), chunk_rows):
+            block = flatten_cells(df.iloc[start:start + chunk_rows])
+            block = block.astype(object).where(block.notna(), None)
+            for row in block.itertuples(index=False, name=None):
+                sheet.append(list(row))
+    workbook.save(path)
+    return path
+
+
+def write_report(df, path, fmt=None):
+    """
+    Write a report DataFrame in the configured format (report_format in .env unless fmt is given).
+    Returns the path actually written, whose extension follows the format.
+    """
+    fmt = (fmt or REPORT_FORMAT).lower()
+    path = output_path(path, fmt)
+
+    if fmt == "xlsx":
+        write_xlsx_streaming(df, path)
+    elif fmt == "parquet":
+        _require_pyarrow(fmt)
+        df = flatten_cells(df)
+        df.to_parquet(path, index=False)
+    elif fmt == "arrow":
+        pyarrow = _require_pyarrow(fmt)
+        from pyarrow import feather
+        df = flatten_cells(df)
+        feather.write_feather(pyarrow.Table.from_pandas(df, preserve_index=False), path, compression="lz4")
+    else:
+        df.to_csv(path, index=False)
+    return path
@@ -0,0 +1,73 @@
+import os
+import threading
+import requests
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from requests.auth import HTTPBasicAuth
+from urllib3.util.retry import Retry
+
+HEADERS = {
+    "Content-Type": "application/json",
+    "Accept": "application/json"
+}
+
+# Retry throttling and transient server errors with exponential backoff (honours Retry-After)
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+def get_settings():
+    """Connection settings for the ServiceNow Table API, read from .env."""
+    load_dotenv()
+    return {
+        "user": os.getenv("user"),
+        "pwd": os.getenv("pwd"),
+        "base_url": os.getenv("url"),
+        "threshold": float(os.getenv("threshold", "0.75")),
+        "max_workers": int(os.getenv("max_workers", "8")),
+        "timeout": float(os.getenv("request_timeout", "30")),
+        "max_retries": int(os.getenv("max_retries", "3")),
+        "backoff_factor": float(os.getenv("retry_backoff", "0.5")),
+    }
+
+
+def build_session(user, pwd, pool_size=8, max_retries=3, backoff_factor=0.5):
+    """
+    requests.Session with a connection pool sized for pool_size concurrent callers.
+    Keep-alive connections are reused, so the TLS + basic auth handshake is paid once per connection.
+    """
+    retry = Retry(
+        total=max_retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset(["GET", "PUT", "PATCH"]),
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+
+    session = requests.Session()
+    session.auth = HTTPBasicAuth(user, pwd)
+    session.headers.update(HEADERS)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session(settings=None):
+    """Process-wide pooled session (requests.Session is safe to share across threads for plain requests)."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                settings = settings or get_settings()
+                _session = build_session(
+                    settings["user"],
+                    settings["pwd"],
+                    pool_size=settings["max_workers"],
+                    max_retries=settings["max_retries"],
+                    backoff_factor=settings["backoff_factor"]
+                )
+    return _session
@@ -3,18 +3,31 @@ import pandas as pd
 import datetime
 import numpy as np
 import os
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from requests.auth import HTTPBasicAuth
 from dotenv import load_dotenv
+from snow_client import build_session, get_settings
+from report_sink import write_report
 
 # ==== CONFIGURATION ====
 load_dotenv()
 user =os.getenv("user")
 pwd =os.getenv("pwd")
-SN_INSTANCE="https://dev296254.service-now.com"
+# Table API base from url in .env (https://<instance>/api/now/table/), so the local mock works too
+TABLE_API = (get_settings()["base_url"] or "https://dev296254.service-now.com/api/now/table/").rstrip("/")
+if TABLE_API.endswith("/incident"):
+    TABLE_API = TABLE_API[:-len("/incident")]
 # API endpoint
-INCIDENT_API = "https://dev296254.service-now.com/api/now/table/incident?sysparm_query=200&sysparm_limit=200"
-SLA_API = f"{SN_INSTANCE}/api/now/table/task_sla"
-AUDIT_API = f"{SN_INSTANCE}/api/now/table/sys_audit"
+INCIDENT_API = f"{TABLE_API}/incident?sysparm_query=200&sysparm_limit=200"
+SLA_API = f"{TABLE_API}/task_sla"
+AUDIT_API = f"{TABLE_API}/sys_audit"
+
+# Bulk enrichment: tickets per IN-query, parallel queries, rows per page
+ENRICH_CHUNK_SIZE = int(os.getenv("enrich_chunk_size", "100"))
+ENRICH_MAX_WORKERS = int(os.getenv("enrich_max_workers", "4"))
+ENRICH_PAGE_SIZE = int(os.getenv("enrich_page_size", "1000"))
+REQUEST_TIMEOUT = float(os.getenv("request_timeout", "30"))
 
 # ==== STEP 1: GET INCIDENTS ====
 def get_closed_incidents():
@@ -44,6 +57,55 @@ def get_reassignment_count(ticket_number):
     r.raise_for_status()
     return len(r.json()["result"])
 
+# ==== STEP 2+3 (BULK): SLA + REASSIGNMENTS FOR MANY TICKETS ====
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def _fetch_all(session, url, query, fields):
+    """Page through one table query and return every record."""
+    records = []
+    offset = 0
+    while True:
+        params = {
+            "sysparm_query": query,
+            "sysparm_fields": fields,
+            "sysparm_limit": ENRICH_PAGE_SIZE,
+            "sysparm_offset": offset
+        }
+        r = session.get(url, params=params, timeout=REQUEST_TIMEOUT)
+        r.raise_for_status()
+        page = r.json()["result"]
+        records.extend(page)
+        if len(page) < ENRICH_PAGE_SIZE:
+            return records
+        offset += ENRICH_PAGE_SIZE
+
+def get_sla_met_bulk(ticket_numbers, session):
+    """{ticket_number: True if no SLA breached} using task.numberIN chunks."""
+    def fetch(chunk):
+        return _fetch_all(session, SLA_API, "task.numberIN" + ",".join(chunk), "task.number,has_breached")
+
+    breached = set()
+    with ThreadPoolExecutor(max_workers=ENRICH_MAX_WORKERS) as executor:
+        for records in executor.map(fetch, list(_chunks(ticket_numbers, ENRICH_CHUNK_SIZE))):
+            for rec in records:
+                if rec.get("has_breached") == "true":
+                    breached.add(rec.get("task.number"))
+    return {number: number not in breached for number in ticket_numbers}
+
+def get_reassignment_counts_bulk(ticket_numbers, session):
+    """{ticket_number: assignment_group audit entries} using documentkeyIN chunks."""
+    def fetch(chunk):
+        query = "documentkeyIN" + ",".join(chunk) + "^fieldname=assignment_group"
+        return _fetch_all(session, AUDIT_API, query, "documentkey")
+
+    counts = Counter()
+    with ThreadPoolExecutor(max_workers=ENRICH_MAX_WORKERS) as executor:
+        for records in executor.map(fetch, list(_chunks(ticket_numbers, ENRICH_CHUNK_SIZE))):
+            counts.update(rec.get("documentkey") for rec in records)
+    return {number: counts.get(number, 0) for number in ticket_numbers}
+
 # ==== STEP 4: DERIVE EXTRA KPIs & SCORES ====
 def compute_quality_scores(notes, category):
     length = len(notes) if notes else 0
@@ -63,63 +125,78 @@ def compute_quality_scores(notes, category):
     
     return clarity, completeness, professionalism, accuracy, actionability, tqi, recommendation
 
+# ==== STEP 4 (VECTORIZED): SCORE A WHOLE FRAME AT ONCE ====
+RECOMMENDATIONS = [
+    "Critical: Resolution notes incomplete. Add detailed steps.",
+    "Improve: Expand resolution notes and ensure closure code accuracy.",
+    "Good: Meets quality standards."
+]
+
+def compute_quality_scores_frame(notes, category):
+    """Column-wise compute_quality_scores over two Series; returns a DataFrame of scores."""
+    notes = notes.fillna("").astype(str)
+    notes_lower = notes.str.lower()
+    category_lower = category.fillna("").astype(str).str.lower()
+
+    clarity = (notes.str.len() // 50).clip(lower=1, upper=5)
+    completeness = np.where(notes_lower.str.contains("steps", regex=False), 5, 3)
+    professionalism = np.where(notes.str[:1].str.isupper(), 5, 3)
+    accuracy = np.where(
+        np.char.find(notes_lower.to_numpy(dtype=str), category_lower.to_numpy(dtype=str)) >= 0, 4, 2
+    )
+    actionability = np.where(notes_lower.str.contains("restarted", regex=False), 4, 2)
+    tqi = ((clarity*0.2 + completeness*0.3 + professionalism*0.1 + accuracy*0.2 + actionability*0.2) * 20).astype(int)
+    recommendation = np.select([tqi < 40, tqi < 70], RECOMMENDATIONS[:2], default=RECOMMENDATIONS[2])
+
+    return pd.DataFrame({
+        "clarity_score": clarity,
+        "completeness_score": completeness,
+        "professionalism_score": professionalism,
+        "accuracy_score": accuracy,
+        "actionability_score": actionability,
+        "ticket_quality_index": tqi,
+        "recommendation_text": recommendation
+    }, index=notes.index)
+
+def compute_mttr_hours(opened_at, resolved_at, closed_at):
+    """Hours from opened to resolved (closed when not resolved), parsed in bulk."""
+    opened = pd.to_datetime(opened_at.replace("", np.nan), errors="coerce")
+    resolved = pd.to_datetime(resolved_at.replace("", np.nan).fillna(closed_at.replace("", np.nan)), errors="coerce")
+    return (resolved - opened).dt.total_seconds() / 3600
+
 # ==== MAIN PIPELINE ====
+INCIDENT_COLUMNS = [
+    "number", "short_description", "category", "subcategory", "priority", "assignment_group",
+    "assigned_to", "opened_by", "opened_at", "resolved_at", "closed_at", "close_code", "close_notes"
+]
+
 def run_pipeline():
-    incidents = get_closed_incidents()
-    records = []
-    
-    for _, row in incidents.iterrows():
-        ticket_number = row["number"]
-        
-        # SLA met
-        sla_met = get_sla_for_ticket(ticket_number)
-        
-        # Reassignment count (override if available in sys_audit)
-        reassignment_count = get_reassignment_count(ticket_number)# or int(row.get("reassignment_count", 0))
-        
-        # MTTR hours
-        opened = pd.to_datetime(row["opened_at"])
-        resolved = pd.to_datetime(row["resolved_at"]) if row["resolved_at"] else pd.to_datetime(row["closed_at"])
-        mttr_hours = (resolved - opened).total_seconds() / 3600 if resolved and opened else None
-        
-        # KB linkage (dummy placeholder, depends on field in your instance)
-        kb_linked = bool(np.random.choice([True, False], p=[0.7, 0.3]))
-        
-        # Quality Scores
-        clarity, completeness, professionalism, accuracy, actionability, tqi, recommendation = compute_quality_scores(
-            row.get("close_notes", ""), row.get("category", "")
-        )
-        
-        records.append({
-            "number": ticket_number,
-            "short_description": row.get("short_description"),
-            "category": row.get("category"),
-            "subcategory": row.get("subcategory"),
-            "priority": row.get("priority"),
-            "assignment_group": row.get("assignment_group"),
-            "assigned_to": row.get("assigned_to"),
-            "opened_by": row.get("opened_by"),
-            "opened_at": row.get("opened_at"),
-            "resolved_at": row.get("resolved_at"),
-            "closed_at": row.get("closed_at"),
-            "close_code": row.get("close_code"),
-            "resolution_notes": row.get("close_notes"),
-            "reassignment_count": reassignment_count,
-            "sla_met": sla_met,
-            "mttr_hours": mttr_hours,
-            "kb_linked": kb_linked,
-            "clarity_score": clarity,
-            "completeness_score": completeness,
-            "professionalism_score": professionalism,
-            "accuracy_score": accuracy,
-            "actionability_score": actionability,
-            "ticket_quality_index": tqi,
-            "recommendation_text": recommendation
-        })
-    
-    df_final = pd.DataFrame(records)
-    df_final.to_excel("ticket_quality_dashboard_servicenow.xlsx", index=False)
-    print("✅ Dataset saved as ticket_quality_dashboard_servicenow.xlsx")
+    incidents = get_closed_incidents().reindex(columns=INCIDENT_COLUMNS)
+
+    # Enrich every ticket up front: a few chunked IN-queries over one pooled session
+    # instead of two round trips per ticket
+    ticket_numbers = list(dict.fromkeys(incidents["number"]))
+    session = build_session(user, pwd, pool_size=ENRICH_MAX_WORKERS)
+    sla_by_ticket = get_sla_met_bulk(ticket_numbers, session)
+    reassignments_by_ticket = get_reassignment_counts_bulk(ticket_numbers, session)
+
+    df_final = incidents.rename(columns={"close_notes": "resolution_notes"})
+
+    # Reassignment count (override if available in sys_audit) and SLA met
+    df_final["reassignment_count"] = incidents["number"].map(reassignments_by_ticket)
+    df_final["sla_met"] = incidents["number"].map(sla_by_ticket)
+
+    # MTTR hours
+    df_final["mttr_hours"] = compute_mttr_hours(incidents["opened_at"], incidents["resolved_at"], incidents["closed_at"])
+
+    # KB linkage (dummy placeholder, depends on field in your instance)
+    df_final["kb_linked"] = np.random.choice([True, False], size=len(incidents), p=[0.7, 0.3])
+
+    # Quality Scores
+    df_final = pd.concat([df_final, compute_quality_scores_frame(incidents["close_notes"], incidents["category"])], axis=1)
+
+    output_file = write_report(df_final, "ticket_quality_dashboard_servicenow.xlsx")
+    print(f"✅ Dataset saved as {output_file}")
 
 # ==== RUN ====
 if __name__ == "__main__":